@@ -1,6 +1,7 @@
+import atexit
 from decimal import Decimal
 
-from flask import Flask
+from flask import Flask, jsonify
 from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from config import Config
@@ -10,7 +11,8 @@ from blueprints.documents import documents_bp
 from blueprints.customers import customers_bp
 from blueprints.upload import upload_bp
 from blueprints.admin import admin_bp
-from db import init_db, close_db
+from blueprints.jobs import jobs_bp
+from db import init_db, close_db, PoolTimeout
 
 
 class CustomJSONProvider(DefaultJSONProvider):
@@ -32,12 +34,26 @@ def create_app() -> Flask:
 
     init_db()
 
+    # Preload templates; LibreOffice converters start per worker on its first request
+    from services import document_generator, office_pool
+    document_generator.warm_up()
+    atexit.register(office_pool.shutdown)
+
     app.register_blueprint(health_bp)
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(documents_bp, url_prefix="/api/documents")
     app.register_blueprint(customers_bp, url_prefix="/api/customers")
     app.register_blueprint(upload_bp, url_prefix="/api/upload")
     app.register_blueprint(admin_bp, url_prefix="/api/admin")
+    app.register_blueprint(jobs_bp, url_prefix="/api/jobs")
+
+    @app.before_request
+    def warm_office_pool():
+        office_pool.warm_up()
+
+    @app.errorhandler(PoolTimeout)
+    def pool_timeout(exception):
+        return jsonify({"error": "Tjenesten er opptatt. Prøv igjen om litt."}), 503
 
     @app.teardown_appcontext
     def shutdown(exception=None):
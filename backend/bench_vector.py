@@ -0,0 +1,92 @@
+"""Benchmark approximate vs exact vector search on knowledge_chunks.
+
+Uses random stored chunk embeddings as queries, runs each query with the
+HNSW index at several ef_search values and once as an exact scan, and
+reports recall@k and latency.
+
+Usage:
+    python bench_vector.py                         # 50 queries, k=5
+    python bench_vector.py --queries 200 --k 10
+    python bench_vector.py --ef 20,40,64,100,200
+"""
+import time
+import argparse
+import statistics
+import psycopg2
+from migrate import DATABASE_URL
+
+QUERY = """
+    SELECT id FROM knowledge_chunks
+    ORDER BY embedding <=> %s::vector
+    LIMIT %s
+"""
+
+
+def _run(cur, vector: str, k: int, settings: dict[str, str]) -> tuple[list[int], float]:
+    for name, value in settings.items():
+        cur.execute("SELECT set_config(%s, %s, true)", (name, value))
+    start = time.perf_counter()
+    cur.execute(QUERY, (vector, k))
+    ids = [row[0] for row in cur.fetchall()]
+    elapsed = (time.perf_counter() - start) * 1000
+    cur.connection.rollback()
+    return ids, elapsed
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ef", default="20,40,64,100,200", help="comma-separated hnsw.ef_search values")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+
+    cur.execute("SELECT COUNT(*) FROM knowledge_chunks")
+    total = cur.fetchone()[0]
+    cur.execute(
+        "SELECT embedding::text FROM knowledge_chunks WHERE embedding IS NOT NULL ORDER BY random() LIMIT %s",
+        (args.queries,),
+    )
+    vectors = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+    if not vectors:
+        print("No embeddings in knowledge_chunks.")
+        return
+
+    print(f"{total} chunks, {len(vectors)} queries, k={args.k}\n")
+
+    # Ground truth with index scans disabled
+    exact = []
+    exact_ms = []
+    for vector in vectors:
+        ids, ms = _run(cur, vector, args.k, {"enable_indexscan": "off"})
+        exact.append(set(ids))
+        exact_ms.append(ms)
+
+    print(f"{'mode':<16}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'exact':<16}{1.0:>10.3f}{statistics.median(exact_ms):>10.2f}{_percentile(exact_ms, 0.95):>10.2f}")
+
+    for ef in args.ef.split(","):
+        recalls = []
+        latencies = []
+        for vector, truth in zip(vectors, exact):
+            ids, ms = _run(cur, vector, args.k, {"hnsw.ef_search": ef.strip()})
+            recalls.append(len(truth & set(ids)) / max(len(truth), 1))
+            latencies.append(ms)
+        label = f"hnsw ef={ef.strip()}"
+        print(f"{label:<16}{statistics.mean(recalls):>10.3f}{statistics.median(latencies):>10.2f}"
+              f"{_percentile(latencies, 0.95):>10.2f}")
+
+    cur.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -112,7 +112,8 @@ def upload_knowledge():
     description = request.form.get("description", "")
 
     result = process_knowledge_document(file, category, description, g.user_id)
-    return jsonify(result), 201
+    # 207: stored, but some chunks could not be embedded
+    return jsonify(result), 207 if result["failed_batches"] else 201
 
 
 @admin_bp.route("/knowledge/<int:doc_id>", methods=["DELETE"])
@@ -140,6 +141,43 @@ def search_knowledge():
     if not query:
         return jsonify({"error": "Mangler søkeord"}), 400
 
+    mode = request.args.get("mode")
+    if mode not in (None, "hybrid", "vector", "lexical"):
+        return jsonify({"error": "Ugyldig søkemodus"}), 400
+
     from services.embedding_service import search_similar
-    results = search_similar(query, limit=5)
+    results = search_similar(query, limit=5, mode=mode)
     return jsonify(results)
+
+
+# --- Prompts ---
+
+@admin_bp.route("/prompts", methods=["GET"])
+@require_admin
+def list_prompts():
+    from services import prompt_registry
+    return jsonify(prompt_registry.prompt_hashes())
+
+
+@admin_bp.route("/prompts/reload", methods=["POST"])
+@require_admin
+@require_csrf
+def reload_prompts():
+    from services import prompt_registry
+    return jsonify(prompt_registry.reload())
+
+
+# --- Metrics ---
+
+@admin_bp.route("/metrics", methods=["GET"])
+@require_admin
+def metrics():
+    """Cache and pool statistics for the worker process that serves the request."""
+    import db
+    from services import embedding_service, llm_router
+    return jsonify({
+        "db_pool": db.pool_stats(),
+        "embedding_cache": embedding_service.cache_stats(),
+        "user_cache": user_model.cache_stats(),
+        "llm_providers": llm_router.stats(),
+    })
@@ -1,6 +1,9 @@
+import io
+import csv
 from flask import Blueprint, request, jsonify
 from middleware.auth import require_auth, require_csrf
 from models import customer as customer_model
+from services import customer_search
 
 customers_bp = Blueprint("customers", __name__)
 
@@ -10,7 +13,7 @@ customers_bp = Blueprint("customers", __name__)
 def list_customers():
     query = request.args.get("q")
     limit = request.args.get("limit", 20, type=int)
-    customers = customer_model.search(query=query, limit=min(limit, 100))
+    customers = customer_search.search(query, limit=min(limit, 100))
     return jsonify(customers)
 
 
@@ -44,7 +47,9 @@ def create_customer():
         contact_person=data.get("contact_person"),
         phone=data.get("phone"),
         email=data.get("email"),
+        org_nr=data.get("org_nr"),
     )
+    customer_search.invalidate()
     return jsonify(customer), 201
 
 
@@ -61,6 +66,7 @@ def update_customer(customer_id: int):
         return jsonify({"error": "Mangler data"}), 400
 
     updated = customer_model.update(customer_id, **data)
+    customer_search.invalidate()
     return jsonify(updated)
 
 
@@ -75,6 +81,18 @@ def import_customers():
     if not file.filename or not file.filename.endswith(".csv"):
         return jsonify({"error": "Filen må være CSV"}), 400
 
-    csv_text = file.read().decode("utf-8-sig")
-    count = customer_model.import_csv(csv_text)
-    return jsonify({"message": f"Importerte {count} kunder", "count": count})
+    # Parsed as it streams in; the upload is never decoded into one string
+    stream = io.TextIOWrapper(file.stream, encoding="utf-8-sig", newline="")
+    try:
+        result = customer_model.import_csv(stream)
+    except (UnicodeDecodeError, csv.Error):
+        return jsonify({"error": "Kunne ikke lese CSV-filen (forventer UTF-8)"}), 400
+    customer_search.invalidate()
+    return jsonify({
+        "message": (
+            f"Importerte {result['inserted']} nye og oppdaterte {result['updated']} kunder "
+            f"({result['skipped']} hoppet over)"
+        ),
+        "count": result["inserted"] + result["updated"],
+        **result,
+    })
@@ -1,20 +1,73 @@
 import os
-from flask import Blueprint, request, jsonify, g
+import base64
+import logging
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, g, current_app, stream_with_context
 from middleware.auth import require_auth, require_csrf
+from middleware.idempotency import idempotent
+from db import unit_of_work, transactional, commit, savepoint
 from models import document as doc_model
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 documents_bp = Blueprint("documents", __name__)
 
 
+def _encode_cursor(key: tuple) -> str:
+    # "t" pages by updated_at (plain list), "r" by rank (search results)
+    value, doc_id = key
+    if isinstance(value, datetime):
+        raw = f"t|{value.isoformat()}|{doc_id}"
+    else:
+        raw = f"r|{value!r}|{doc_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, search: bool) -> tuple:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    kind, value, doc_id = raw.split("|")
+    if kind != ("r" if search else "t"):
+        raise ValueError("cursor does not match the query")
+    return (float(value) if search else datetime.fromisoformat(value)), int(doc_id)
+
+
 @documents_bp.route("", methods=["GET"])
 @require_auth
 def list_documents():
+    """Finalized documents, newest first, one page at a time.
+
+    Pass the returned next_cursor as ?cursor= to get the next page. fields=
+    selects columns (comma-separated); the default leaves out large text.
+    With ?search=, results are ranked and carry a highlighted headline.
+    """
     search = request.args.get("search")
     doc_type = request.args.get("type")
     is_admin = g.user_role == "admin"
-    docs = doc_model.list_by_user(g.user_id, search=search, doc_type=doc_type, admin=is_admin)
-    return jsonify(docs)
+    limit = min(max(request.args.get("limit", Config.DOCUMENTS_PAGE_SIZE, type=int), 1), 200)
+
+    after = None
+    if request.args.get("cursor"):
+        try:
+            after = _decode_cursor(request.args["cursor"], bool(search))
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"error": "Ugyldig cursor"}), 400
+
+    fields = None
+    if request.args.get("fields"):
+        fields = [f.strip() for f in request.args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in doc_model.LISTABLE_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Ukjente felt: {', '.join(unknown)}"}), 400
+
+    docs, next_key = doc_model.list_by_user(
+        g.user_id, search=search, doc_type=doc_type, admin=is_admin,
+        limit=limit, after=after, fields=fields,
+    )
+    return jsonify({
+        "documents": docs,
+        "next_cursor": _encode_cursor(next_key) if next_key else None,
+    })
 
 
 @documents_bp.route("/<int:doc_id>", methods=["GET"])
@@ -29,6 +82,7 @@ def get_document(doc_id: int):
 @documents_bp.route("", methods=["POST"])
 @require_auth
 @require_csrf
+@idempotent
 def create_document():
     data = request.get_json()
     if not data:
@@ -70,6 +124,8 @@ def create_document():
 @documents_bp.route("/<int:doc_id>", methods=["PUT"])
 @require_auth
 @require_csrf
+@idempotent
+@transactional
 def update_document(doc_id: int):
     doc = doc_model.find_by_id(doc_id)
     if not doc or (doc["user_id"] != g.user_id and g.user_role != "admin"):
@@ -96,6 +152,8 @@ def update_document(doc_id: int):
 @documents_bp.route("/<int:doc_id>", methods=["DELETE"])
 @require_auth
 @require_csrf
+@idempotent
+@transactional
 def delete_document(doc_id: int):
     doc = doc_model.find_by_id(doc_id)
     if not doc or (doc["user_id"] != g.user_id and g.user_role != "admin"):
@@ -114,79 +172,168 @@ def delete_document(doc_id: int):
 @documents_bp.route("/<int:doc_id>/generate", methods=["POST"])
 @require_auth
 @require_csrf
+@idempotent
+@transactional
 def generate_text(doc_id: int):
-    doc = doc_model.find_by_id(doc_id)
+    # Row lock until commit: a parallel request waits here, then sees "generating"
+    doc = doc_model.find_by_id(doc_id, for_update=True)
     if not doc or (doc["user_id"] != g.user_id and g.user_role != "admin"):
         return jsonify({"error": "Dokument ikke funnet"}), 404
+    if doc["status"] == "finalized":
+        return jsonify({"error": "Kan ikke regenerere fullført dokument"}), 400
+    if doc["status"] != "draft":
+        return jsonify({"error": "Dokumentet er allerede under behandling"}), 409
+
+    data = request.get_json() or {}
+    prompt = data.get("prompt", doc.get("ai_prompt", ""))
 
-    # Lock document for generation (prevents parallel requests)
-    if not doc_model.set_status(doc_id, "generating", ["draft"]):
+    # Status and job commit together, so a failed enqueue leaves the draft as it was.
+    # Generation runs in worker.py; the client polls /api/jobs/<id>
+    from services.job_service import enqueue
+    doc_model.set_status(doc_id, "generating")
+    job = enqueue("generate_text", {"prompt": prompt, "stream": bool(data.get("stream"))},
+                  user_id=g.user_id, document_id=doc_id)
+
+    resp = jsonify({"job_id": job["id"], "status": job["status"], "document_id": doc_id})
+    resp.headers["Location"] = f"/api/jobs/{job['id']}"
+    return resp, 202
+
+
+@documents_bp.route("/<int:doc_id>/generate/stream", methods=["POST"])
+@require_auth
+@require_csrf
+@idempotent
+def generate_text_stream(doc_id: int):
+    """Generate text and stream it to the client as Server-Sent Events.
+
+    The LLM call runs in this web worker for the whole stream. The UI uses
+    POST /generate instead, where worker.py generates and the client polls
+    the job's partial text; this endpoint is for API clients.
+    """
+    # The lock commits before streaming starts; the stream itself holds no connection
+    with unit_of_work():
+        doc = doc_model.find_by_id(doc_id, for_update=True)
+        if not doc or (doc["user_id"] != g.user_id and g.user_role != "admin"):
+            return jsonify({"error": "Dokument ikke funnet"}), 404
         if doc["status"] == "finalized":
             return jsonify({"error": "Kan ikke regenerere fullført dokument"}), 400
-        return jsonify({"error": "Dokumentet er allerede under behandling"}), 409
-
-    try:
-        data = request.get_json() or {}
-        prompt = data.get("prompt", doc.get("ai_prompt", ""))
-
-        from services.ai_service import generate_document_text, generate_document_name
-        result = generate_document_text(doc, prompt)
-
-        # Auto-generate document name from content
-        doc_name = generate_document_name(doc, result["text"])
-
-        updates = {
-            "document_text": result["text"],
-            "ai_model": result["model"],
-            "document_name": doc_name,
-            "status": "draft",
-        }
-        if prompt:
-            updates["ai_prompt"] = prompt
-
-        updated = doc_model.update(doc_id, **updates)
-        return jsonify(updated)
-    except Exception:
-        doc_model.set_status(doc_id, "draft")
-        raise
+        if doc["status"] != "draft":
+            return jsonify({"error": "Dokumentet er allerede under behandling"}), 409
+        doc_model.set_status(doc_id, "generating")
+
+    data = request.get_json(silent=True) or {}
+    prompt = data.get("prompt", doc.get("ai_prompt", ""))
+    json_dumps = current_app.json.dumps
+
+    def _sse(event: str, payload) -> str:
+        return f"event: {event}\ndata: {json_dumps(payload)}\n\n"
+
+    def events():
+        try:
+            from services.ai_service import stream_document_text
+            from services.job_service import save_generated_text
+
+            result = None
+            for event, payload in stream_document_text(doc, prompt):
+                if event == "delta":
+                    yield _sse("delta", {"text": payload})
+                elif event == "reset":
+                    yield _sse("reset", {})
+                elif event == "done":
+                    result = payload
+
+            updated = save_generated_text(doc, prompt, result, user_id=g.user_id)
+            yield _sse("done", updated)
+        except Exception:
+            logger.exception("Streaming generation failed for document %s", doc_id)
+            yield _sse("error", {"error": "Kunne ikke generere tekst. Prøv igjen senere."})
+        finally:
+            # Also runs when the client disconnects mid-stream
+            doc_model.set_status(doc_id, "draft", ["generating"])
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @documents_bp.route("/<int:doc_id>/finalize", methods=["POST"])
 @require_auth
 @require_csrf
+@idempotent
+@transactional
 def finalize_document(doc_id: int):
-    doc = doc_model.find_by_id(doc_id)
+    doc = doc_model.find_by_id(doc_id, for_update=True)
     if not doc or (doc["user_id"] != g.user_id and g.user_role != "admin"):
         return jsonify({"error": "Dokument ikke funnet"}), 404
     if not doc.get("document_text"):
         return jsonify({"error": "Dokumentet har ingen tekst"}), 400
-
-    # Lock for finalization (prevents parallel requests)
-    if not doc_model.set_status(doc_id, "finalizing", ["draft"]):
-        if doc["status"] == "finalized":
-            return jsonify({"error": "Dokument allerede fullført"}), 400
+    if doc["status"] == "finalized":
+        return jsonify({"error": "Dokument allerede fullført"}), 400
+    if doc["status"] != "draft":
         return jsonify({"error": "Dokumentet er under behandling"}), 409
 
+    # Publish the lock before the slow conversion; this also releases the row
+    # lock and hands the connection back to the pool
+    doc_model.set_status(doc_id, "finalizing")
+    commit()
+
+    # No database access until the files exist, so no connection is held meanwhile
+    from services.document_generator import generate_files
+    from services.office_pool import OfficePoolBusy
     try:
-        from services.document_generator import generate_files
         file_paths = generate_files(doc)
+    except OfficePoolBusy:
+        doc_model.set_status(doc_id, "draft")
+        return jsonify({"error": "PDF-generering er opptatt. Prøv igjen om litt."}), 503
+    except Exception:
+        doc_model.set_status(doc_id, "draft")
+        commit()
+        raise
 
-        if not file_paths.get("word"):
-            doc_model.set_status(doc_id, "draft")
-            return jsonify({"error": "Kunne ikke generere dokumentfiler"}), 500
+    if not file_paths.get("word"):
+        doc_model.set_status(doc_id, "draft")
+        return jsonify({"error": "Kunne ikke generere dokumentfiler"}), 500
 
-        updated = doc_model.finalize(doc_id, file_paths)
-        return jsonify(updated)
+    try:
+        with savepoint():
+            updated = doc_model.finalize(doc_id, file_paths)
     except Exception:
+        # The savepoint has undone the failed write; commit the unlock before re-raising
         doc_model.set_status(doc_id, "draft")
+        commit()
         raise
+    return jsonify(updated)
+
+
+def _send_download(file_path: str):
+    """Hand the file to nginx with X-Accel-Redirect when configured, else
+    serve it here with a content-hash ETag, 304s and Range support."""
+    import mimetypes
+    from flask import send_file
+    from urllib.parse import quote
+    from services.attachment_service import content_hash
+
+    upload_dir = os.path.realpath(Config.UPLOAD_DIR)
+    real_path = os.path.realpath(file_path)
+    if Config.DOWNLOAD_ACCEL_PREFIX and real_path.startswith(upload_dir + os.sep):
+        # nginx serves the body (and ETag, If-None-Match and Range) from its internal location
+        resp = Response(mimetype=mimetypes.guess_type(real_path)[0] or "application/octet-stream")
+        relative = os.path.relpath(real_path, upload_dir).replace(os.sep, "/")
+        resp.headers["X-Accel-Redirect"] = Config.DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + quote(relative)
+        resp.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(os.path.basename(real_path))}"
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
+    resp = send_file(real_path, as_attachment=True, etag=content_hash(real_path), conditional=True)
+    resp.cache_control.private = True
+    return resp
 
 
 @documents_bp.route("/<int:doc_id>/download/<file_type>")
 @require_auth
 def download_file(doc_id: int, file_type: str):
-    from flask import send_file
-
     doc = doc_model.find_by_id(doc_id)
     if not doc or (doc["user_id"] != g.user_id and g.user_role != "admin"):
         return jsonify({"error": "Dokument ikke funnet"}), 404
@@ -205,12 +352,14 @@ def download_file(doc_id: int, file_type: str):
     if not file_path or not os.path.exists(file_path):
         return jsonify({"error": "Fil ikke funnet"}), 404
 
-    return send_file(file_path, as_attachment=True)
+    return _send_download(file_path)
 
 
 @documents_bp.route("/<int:doc_id>/clone", methods=["POST"])
 @require_auth
 @require_csrf
+@idempotent
+@transactional
 def clone_document(doc_id: int):
     doc = doc_model.find_by_id(doc_id)
     if not doc or (doc["user_id"] != g.user_id and g.user_role != "admin"):
@@ -226,6 +375,8 @@ def clone_document(doc_id: int):
 @documents_bp.route("/<int:doc_id>/email", methods=["POST"])
 @require_auth
 @require_csrf
+@idempotent
+@transactional
 def email_document(doc_id: int):
     doc = doc_model.find_by_id(doc_id)
     if not doc or (doc["user_id"] != g.user_id and g.user_role != "admin"):
@@ -237,6 +388,7 @@ def email_document(doc_id: int):
     from models import user as user_model
 
     user = user_model.find_by_id(g.user_id)
+    commit()  # reads are done; don't hold the connection during SMTP
     success = send_document_email(doc, user["email"])
 
     if success:
@@ -0,0 +1,26 @@
+from flask import Blueprint, jsonify, g
+from middleware.auth import require_auth
+from models import job as job_model
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+@jobs_bp.route("/<int:job_id>", methods=["GET"])
+@require_auth
+def get_job(job_id: int):
+    job = job_model.find_by_id(job_id)
+    if not job or (job["user_id"] != g.user_id and g.user_role != "admin"):
+        return jsonify({"error": "Jobb ikke funnet"}), 404
+
+    return jsonify({
+        "id": job["id"],
+        "job_type": job["job_type"],
+        "status": job["status"],
+        "document_id": job["document_id"],
+        "result": job["result"],
+        "progress": job["progress"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    })
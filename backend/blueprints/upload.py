@@ -1,10 +1,13 @@
 import os
 import uuid
-from flask import Blueprint, request, jsonify
+import logging
+from flask import Blueprint, request, jsonify, g
 from werkzeug.utils import secure_filename
 from middleware.auth import require_auth, require_csrf
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 upload_bp = Blueprint("upload", __name__)
 
 MAGIC_BYTES = {
@@ -69,9 +72,21 @@ def upload_file():
 
     file.save(filepath)
 
+    # Extract text in worker.py so generation only reads it back
+    from services import attachment_service
+    digest = None
+    if ext in attachment_service.EXTRACTABLE:
+        digest = attachment_service.content_hash(filepath)
+        try:
+            from services.job_service import enqueue
+            enqueue("extract_attachment", {"path": filepath, "content_hash": digest}, user_id=g.user_id)
+        except Exception:
+            logger.exception("Could not queue text extraction for %s", random_name)
+
     return jsonify({
         "filename": original_name,
         "stored_name": random_name,
         "path": filepath,
         "size": size,
+        "content_hash": digest,
     }), 201
@@ -14,6 +14,104 @@ class Config:
     MAX_UPLOAD_SIZE: int = 20 * 1024 * 1024  # 20 MB
     ALLOWED_EXTENSIONS: set[str] = {"pdf", "docx", "doc", "xlsx", "xls", "jpg", "jpeg", "png"}
 
+    # Internal nginx location that serves UPLOAD_DIR for downloads (X-Accel-Redirect);
+    # empty serves files from Flask
+    DOWNLOAD_ACCEL_PREFIX: str = os.environ.get("DOWNLOAD_ACCEL_PREFIX", "")
+
+    # Postgres connection pool per process (db.py)
+    DB_POOL_MIN: int = int(os.environ.get("DB_POOL_MIN", "1"))
+    DB_POOL_MAX: int = int(os.environ.get("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT: float = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_MAX_AGE: float = float(os.environ.get("DB_POOL_MAX_AGE", "1800"))
+    DB_POOL_CHECK_IDLE: float = float(os.environ.get("DB_POOL_CHECK_IDLE", "30"))
+
+    # Default page size of GET /api/documents
+    DOCUMENTS_PAGE_SIZE: int = int(os.environ.get("DOCUMENTS_PAGE_SIZE", "50"))
+
+    # Customer typeahead: in-process prefix index (services/customer_search.py)
+    CUSTOMER_PREFIX_INDEX: bool = os.environ.get("CUSTOMER_PREFIX_INDEX", "1") == "1"
+    CUSTOMER_INDEX_CHECK_INTERVAL: float = float(os.environ.get("CUSTOMER_INDEX_CHECK_INTERVAL", "5"))
+
+    # Background jobs (worker.py)
+    LLM_WORKERS: int = int(os.environ.get("LLM_WORKERS", "2"))
+    JOB_POLL_INTERVAL: float = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+    JOB_STALE_SECONDS: int = int(os.environ.get("JOB_STALE_SECONDS", "600"))
+    # Seconds between writes of a generation job's partial text
+    JOB_PROGRESS_INTERVAL: float = float(os.environ.get("JOB_PROGRESS_INTERVAL", "0.5"))
+
+    # Shared LLM/embedding HTTP clients (services/llm_clients.py)
+    LLM_TIMEOUT: float = float(os.environ.get("LLM_TIMEOUT", "120"))
+    LLM_CONNECT_TIMEOUT: float = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_MAX_RETRIES: int = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+    LLM_POOL_MAX_CONNECTIONS: int = int(os.environ.get("LLM_POOL_MAX_CONNECTIONS", "20"))
+    LLM_POOL_MAX_KEEPALIVE: int = int(os.environ.get("LLM_POOL_MAX_KEEPALIVE", "10"))
+    LLM_POOL_KEEPALIVE_EXPIRY: float = float(os.environ.get("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+
+    # Provider routing (services/llm_router.py): preference order, health tracking and hedging
+    LLM_PROVIDERS: list[str] = os.environ.get("LLM_PROVIDERS", "claude,gpt,gemini").split(",")
+    LLM_EWMA_ALPHA: float = float(os.environ.get("LLM_EWMA_ALPHA", "0.2"))
+    LLM_MAX_ERROR_RATE: float = float(os.environ.get("LLM_MAX_ERROR_RATE", "0.5"))
+    LLM_CIRCUIT_FAILURES: int = int(os.environ.get("LLM_CIRCUIT_FAILURES", "3"))
+    LLM_CIRCUIT_COOLDOWN: float = float(os.environ.get("LLM_CIRCUIT_COOLDOWN", "30"))
+    LLM_HEDGE: bool = os.environ.get("LLM_HEDGE", "1") == "1"
+    LLM_HEDGE_DEFAULT: float = float(os.environ.get("LLM_HEDGE_DEFAULT", "45"))
+    LLM_HEDGE_MIN: float = float(os.environ.get("LLM_HEDGE_MIN", "5"))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+    # In-process cache of user rows by id (models/user.py), 0 disables
+    USER_CACHE_SIZE: int = int(os.environ.get("USER_CACHE_SIZE", "1000"))
+    USER_CACHE_TTL: float = float(os.environ.get("USER_CACHE_TTL", "60"))
+
+    # Embedding cache: in-process LRU entries, then the embedding_cache table
+    EMBEDDING_CACHE_SIZE: int = int(os.environ.get("EMBEDDING_CACHE_SIZE", "1000"))
+    EMBEDDING_CACHE_TTL: int = int(os.environ.get("EMBEDDING_CACHE_TTL", str(30 * 24 * 3600)))
+    EMBEDDING_CACHE_MAX_ROWS: int = int(os.environ.get("EMBEDDING_CACHE_MAX_ROWS", "50000"))
+    EMBEDDING_CACHE_EVICT_EVERY: int = int(os.environ.get("EMBEDDING_CACHE_EVICT_EVERY", "100"))
+
+    # Batched embedding for knowledge ingestion
+    EMBEDDING_BATCH_MAX_INPUTS: int = int(os.environ.get("EMBEDDING_BATCH_MAX_INPUTS", "256"))
+    EMBEDDING_BATCH_MAX_TOKENS: int = int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+    EMBEDDING_MAX_RETRIES: int = int(os.environ.get("EMBEDDING_MAX_RETRIES", "5"))
+
+    # pgvector ANN search: hnsw.ef_search (HNSW) and ivfflat.probes (IVFFlat)
+    VECTOR_EF_SEARCH: int = int(os.environ.get("VECTOR_EF_SEARCH", "64"))
+    VECTOR_PROBES: int = int(os.environ.get("VECTOR_PROBES", "10"))
+
+    # Knowledge retrieval: "hybrid", "vector" or "lexical"
+    RAG_MODE: str = os.environ.get("RAG_MODE", "hybrid")
+    RAG_EMBEDDING_BUDGET_MS: int = int(os.environ.get("RAG_EMBEDDING_BUDGET_MS", "1500"))
+    RAG_CANDIDATE_MULTIPLIER: int = int(os.environ.get("RAG_CANDIDATE_MULTIPLIER", "4"))
+    RAG_RRF_K: int = int(os.environ.get("RAG_RRF_K", "60"))
+
+    # Per-stage time budgets for prompt context assembly (ai_service._build_user_prompt)
+    CONTEXT_RAG_BUDGET_MS: int = int(os.environ.get("CONTEXT_RAG_BUDGET_MS", "4000"))
+    CONTEXT_ATTACHMENT_BUDGET_MS: int = int(os.environ.get("CONTEXT_ATTACHMENT_BUDGET_MS", "10000"))
+
+    # Attachment text extraction (services/attachment_service.py)
+    ATTACHMENT_MAX_CHARS: int = int(os.environ.get("ATTACHMENT_MAX_CHARS", "200000"))
+    # Seconds before a failed extraction (e.g. a pdftotext timeout) is tried again
+    ATTACHMENT_RETRY_FAILED_AFTER: int = int(os.environ.get("ATTACHMENT_RETRY_FAILED_AFTER", "300"))
+
+    # Seconds a response stored under an Idempotency-Key is replayed
+    IDEMPOTENCY_TTL: int = int(os.environ.get("IDEMPOTENCY_TTL", str(24 * 3600)))
+    # Seconds a key stays reserved while its request runs; frees keys of crashed workers
+    IDEMPOTENCY_LEASE: int = int(os.environ.get("IDEMPOTENCY_LEASE", "300"))
+
+    # Reuse completions for identical system prompt + user prompt + context (off by default)
+    GENERATION_CACHE: bool = os.environ.get("GENERATION_CACHE", "0") == "1"
+    GENERATION_CACHE_TTL: int = int(os.environ.get("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # Seconds between mtime checks of prompts/
+    PROMPT_RELOAD_INTERVAL: float = float(os.environ.get("PROMPT_RELOAD_INTERVAL", "5"))
+
+    # LibreOffice converter pool (services/office_pool.py), 0 disables
+    OFFICE_POOL_SIZE: int = int(os.environ.get("OFFICE_POOL_SIZE", "2"))
+    OFFICE_QUEUE_SIZE: int = int(os.environ.get("OFFICE_QUEUE_SIZE", "8"))
+    OFFICE_QUEUE_TIMEOUT: float = float(os.environ.get("OFFICE_QUEUE_TIMEOUT", "120"))
+    OFFICE_CONVERT_TIMEOUT: int = int(os.environ.get("OFFICE_CONVERT_TIMEOUT", "60"))
+    OFFICE_START_TIMEOUT: int = int(os.environ.get("OFFICE_START_TIMEOUT", "30"))
+    OFFICE_HEALTH_INTERVAL: int = int(os.environ.get("OFFICE_HEALTH_INTERVAL", "30"))
+
     @classmethod
     def validate(cls) -> None:
         if cls.SECURE_COOKIES and cls.JWT_SECRET == "change-this-in-production":
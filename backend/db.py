@@ -1,15 +1,190 @@
+import os
+import time
+import logging
+import threading
 import psycopg2
 from psycopg2 import pool
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
 from config import Config
 
-_pool: pool.SimpleConnectionPool | None = None
+logger = logging.getLogger(__name__)
 
 
-def init_db():
+class PoolTimeout(pool.PoolError):
+    """No connection became free within DB_POOL_TIMEOUT seconds."""
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """Connection that carries the pool's bookkeeping timestamps."""
+
+    pool_created: float
+    pool_returned: float
+
+
+class ConnectionPool:
+    """Thread-safe connection pool that waits for a free connection.
+
+    Connections idle for more than DB_POOL_CHECK_IDLE seconds are checked
+    with a round trip before reuse, and connections older than
+    DB_POOL_MAX_AGE are replaced. After a fork the pool starts over empty,
+    so parent and child never share a socket.
+    """
+
+    def __init__(self, dsn: str, minconn: int, maxconn: int):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._cond = threading.Condition()
+        self._reset()
+        for _ in range(minconn):
+            self._size += 1
+            self._idle.append(self._connect())
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._idle: list = []
+        self._size = 0
+        self._waiting = 0
+        self._stats = {
+            "checkouts": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+            "timeouts": 0, "replaced": 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=_PooledConnection)
+        conn.pool_created = time.monotonic()
+        conn.pool_returned = conn.pool_created
+        return conn
+
+    def _check_fork(self) -> None:
+        if self._pid != os.getpid():
+            # Never close inherited connections: that would end the parent's sessions
+            _inherited.extend(self._idle)
+            self._reset()
+
+    def _usable(self, conn) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - conn.pool_created > Config.DB_POOL_MAX_AGE:
+            return False
+        if now - conn.pool_returned > Config.DB_POOL_CHECK_IDLE:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + Config.DB_POOL_TIMEOUT
+        with self._cond:
+            self._check_fork()
+            waited = False
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection free within {Config.DB_POOL_TIMEOUT}s")
+                waited = True
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            wait = time.monotonic() - start
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_seconds"] += wait
+                self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+
+        # Connect and health-check outside the lock
+        try:
+            if conn is not None and not self._usable(conn):
+                self._discard(conn)
+                with self._cond:
+                    self._stats["replaced"] += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn) -> None:
+        with self._cond:
+            if self._pid != os.getpid():
+                return  # checked out before a fork; the pool has started over
+            if conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                conn.pool_returned = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        with self._cond:
+            if self._pid == os.getpid():
+                for conn in self._idle:
+                    self._discard(conn)
+            self._reset()
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._check_fork()
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                waiting=self._waiting,
+                max=self.maxconn,
+            )
+        stats["avg_wait_ms"] = round(stats["wait_seconds"] * 1000 / stats["waits"], 1) if stats["waits"] else 0.0
+        stats["max_wait_ms"] = round(stats.pop("max_wait_seconds") * 1000, 1)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        return stats
+
+
+_pool: ConnectionPool | None = None
+
+# Connections inherited from a parent process; kept referenced so they are
+# never garbage-collected (and closed) here.
+_inherited: list = []
+
+
+def init_db(minconn: int | None = None, maxconn: int | None = None):
     global _pool
-    _pool = pool.SimpleConnectionPool(1, 5, Config.DATABASE_URL)
+    _pool = ConnectionPool(
+        Config.DATABASE_URL,
+        Config.DB_POOL_MIN if minconn is None else minconn,
+        Config.DB_POOL_MAX if maxconn is None else maxconn,
+    )
 
 
 def close_db():
@@ -19,14 +194,134 @@ def close_db():
         _pool = None
 
 
+def pool_stats() -> dict:
+    return _pool.stats() if _pool else {}
+
+
+class _Unit:
+    """Connection and transaction shared by the model calls of one unit of work."""
+
+    def __init__(self):
+        self.conn = None
+        self.savepoints = 0
+
+
+_unit: ContextVar[_Unit | None] = ContextVar("db_unit", default=None)
+
+
+@contextmanager
+def unit_of_work():
+    """Run every get_cursor() inside the block on one connection and one
+    transaction, committed when the block exits (rolled back on an exception).
+
+    The connection is checked out on first use. commit() ends the transaction
+    early and hands the connection back until the next query. Nested units
+    join the outer one.
+    """
+    if _unit.get() is not None:
+        yield
+        return
+
+    unit = _Unit()
+    token = _unit.set(unit)
+    try:
+        yield
+        if unit.conn:
+            unit.conn.commit()
+    except Exception:
+        if unit.conn:
+            try:
+                unit.conn.rollback()
+            except psycopg2.Error:
+                pass  # connection is dead; putconn drops it
+        raise
+    finally:
+        if unit.conn:
+            _pool.putconn(unit.conn)
+        _unit.reset(token)
+
+
+def transactional(f):
+    """Run a view (or any function) as one unit of work."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        with unit_of_work():
+            return f(*args, **kwargs)
+
+    return decorated
+
+
+def commit() -> None:
+    """Commit the current unit of work now, e.g. to publish a status lock
+    before slow work. No-op outside a unit, where every get_cursor commits."""
+    unit = _unit.get()
+    if unit and unit.conn:
+        conn, unit.conn = unit.conn, None
+        try:
+            conn.commit()
+        finally:
+            _pool.putconn(conn)
+
+
+@contextmanager
+def savepoint():
+    """Roll back only the block's changes if it raises, keeping the rest of
+    the unit of work usable (for cleanup writes before re-raising)."""
+    unit = _unit.get()
+    if unit is None:
+        yield
+        return
+
+    unit.savepoints += 1
+    name = f"uow_{unit.savepoints}"
+    with get_cursor() as cur:
+        cur.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except Exception:
+        if unit.conn and not unit.conn.closed:
+            try:
+                with get_cursor() as cur:
+                    cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            except psycopg2.Error:
+                pass  # connection is dead; the unit rolls back and drops it
+        raise
+    with get_cursor() as cur:
+        cur.execute(f"RELEASE SAVEPOINT {name}")
+
+
+@contextmanager
+def own_transaction():
+    """Run the block's queries outside any current unit of work, each
+    get_cursor() on its own connection and transaction as usual. For
+    best-effort side writes (caches) whose errors are swallowed: a failed
+    statement must not abort the unit's transaction, and a rollback of the
+    unit need not undo them."""
+    token = _unit.set(None)
+    try:
+        yield
+    finally:
+        _unit.reset(token)
+
+
 @contextmanager
 def get_conn():
+    unit = _unit.get()
+    if unit is not None:
+        if unit.conn is None:
+            unit.conn = _pool.getconn()
+        yield unit.conn
+        return
+
     conn = _pool.getconn()
     try:
         yield conn
         conn.commit()
     except Exception:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass  # connection is dead; putconn drops it
         raise
     finally:
         _pool.putconn(conn)
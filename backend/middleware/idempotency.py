@@ -0,0 +1,61 @@
+import hashlib
+from functools import wraps
+from flask import request, jsonify, g, make_response
+from config import Config
+from models import idempotency as idempotency_model
+
+# Response headers worth replaying along with the body
+_REPLAY_HEADERS = ("Location", "Content-Type")
+
+
+def idempotent(f):
+    """Honour an Idempotency-Key header: the first response for a key is stored
+    for IDEMPOTENCY_TTL seconds and replayed for repeats of the same request.
+    Streamed responses are not stored; their key stays reserved until the
+    stream ends. Must be applied after require_auth."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({"error": "Ugyldig Idempotency-Key"}), 400
+
+        request_hash = hashlib.sha256(
+            b"\0".join([request.method.encode(), request.path.encode(), request.get_data()])
+        ).hexdigest()
+
+        user_id = g.user_id
+        existing = idempotency_model.reserve(user_id, key, request_hash, Config.IDEMPOTENCY_LEASE)
+        if existing:
+            if existing["request_hash"] != request_hash:
+                return jsonify({"error": "Idempotency-Key er brukt for en annen forespørsel"}), 422
+            if existing["status"] != "done":
+                return jsonify({"error": "Forespørselen behandles allerede"}), 409
+            resp = make_response(existing["response_body"], existing["response_status"])
+            resp.headers.update(existing["response_headers"] or {})
+            resp.headers["Idempotent-Replayed"] = "true"
+            return resp
+
+        try:
+            resp = make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency_model.release(user_id, key)
+            raise
+
+        if resp.is_streamed:
+            # Repeats get 409 while the stream runs; released when it ends
+            resp.call_on_close(lambda: idempotency_model.release(user_id, key))
+            return resp
+
+        # Server errors and lock conflicts are not stored, so a retry runs again
+        if resp.status_code >= 500 or resp.status_code == 409:
+            idempotency_model.release(user_id, key)
+            return resp
+
+        headers = {h: resp.headers[h] for h in _REPLAY_HEADERS if h in resp.headers}
+        idempotency_model.complete(user_id, key, resp.status_code, resp.get_data(as_text=True), headers,
+                                   Config.IDEMPOTENCY_TTL)
+        return resp
+
+    return decorated
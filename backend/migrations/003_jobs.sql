@@ -0,0 +1,22 @@
+-- Background job queue (claimed by worker.py with FOR UPDATE SKIP LOCKED)
+
+CREATE TABLE jobs (
+    id SERIAL PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 1,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(created_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs(locked_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_jobs_document ON jobs(document_id);
@@ -0,0 +1,12 @@
+-- Persistent embedding cache keyed by sha256(model + text)
+
+CREATE TABLE embedding_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    embedding vector(1536) NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    last_used_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_created ON embedding_cache(created_at);
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used_at);
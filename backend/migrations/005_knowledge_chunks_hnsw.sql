@@ -0,0 +1,6 @@
+-- Approximate nearest-neighbour index for RAG lookups (requires pgvector >= 0.5)
+-- Query-time recall is tuned with Config.VECTOR_EF_SEARCH (hnsw.ef_search)
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_chunks_embedding_hnsw
+    ON knowledge_chunks USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
@@ -0,0 +1,7 @@
+-- Norwegian full-text search on knowledge chunks (lexical half of hybrid RAG)
+
+ALTER TABLE knowledge_chunks
+    ADD COLUMN content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('norwegian', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_chunks_content_tsv
+    ON knowledge_chunks USING gin (content_tsv);
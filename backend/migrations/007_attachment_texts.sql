@@ -0,0 +1,10 @@
+-- Extracted attachment text, keyed by sha256 of the file content
+
+CREATE TABLE attachment_texts (
+    content_hash CHAR(64) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'done'
+        CHECK (status IN ('done', 'failed')),
+    text TEXT,
+    error TEXT,
+    extracted_at TIMESTAMP DEFAULT NOW()
+);
@@ -0,0 +1,30 @@
+-- Stored responses for requests sent with an Idempotency-Key header
+
+CREATE TABLE idempotency_keys (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'in_progress'
+        CHECK (status IN ('in_progress', 'done')),
+    response_status INTEGER,
+    response_body TEXT,
+    response_headers JSONB,
+    created_at TIMESTAMP DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at);
+
+-- Completions keyed by sha256(system prompt, user prompt incl. retrieved context)
+
+CREATE TABLE generation_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    text TEXT NOT NULL,
+    subject VARCHAR(255),
+    model VARCHAR(100),
+    provider VARCHAR(20),
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_generation_cache_created ON generation_cache(created_at);
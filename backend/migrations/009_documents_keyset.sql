@@ -0,0 +1,7 @@
+-- Keyset pagination of the finalized documents list on (updated_at, id)
+
+CREATE INDEX IF NOT EXISTS idx_documents_user_finalized_updated
+    ON documents(user_id, updated_at DESC, id DESC) WHERE status = 'finalized';
+
+CREATE INDEX IF NOT EXISTS idx_documents_finalized_updated
+    ON documents(updated_at DESC, id DESC) WHERE status = 'finalized';
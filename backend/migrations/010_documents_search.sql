@@ -0,0 +1,14 @@
+-- Full-text (Norwegian) and trigram search over documents
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE documents
+    ADD COLUMN search_tsv tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('norwegian', coalesce(document_name, '')), 'A') ||
+        setweight(to_tsvector('norwegian', coalesce(recipient_name, '')), 'A') ||
+        setweight(to_tsvector('norwegian', coalesce(document_text, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_documents_search_tsv ON documents USING gin (search_tsv);
+CREATE INDEX IF NOT EXISTS idx_documents_name_trgm ON documents USING gin (document_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_documents_recipient_trgm ON documents USING gin (recipient_name gin_trgm_ops);
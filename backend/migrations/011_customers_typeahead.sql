@@ -0,0 +1,7 @@
+-- Customer typeahead: name prefix (btree) plus word prefix / fuzzy matching (trigram)
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_customers_name_lower_prefix ON customers (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_name_trgm ON customers USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_contact_trgm ON customers USING gin (contact_person gin_trgm_ops);
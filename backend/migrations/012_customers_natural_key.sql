@@ -0,0 +1,21 @@
+-- Natural key for customer imports: org number, else name + postal code
+
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS org_nr VARCHAR(20);
+
+CREATE OR REPLACE FUNCTION customer_natural_key(org_nr TEXT, name TEXT, postal_code TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN regexp_replace(coalesce(org_nr, ''), '\D', '', 'g') <> ''
+            THEN 'org:' || regexp_replace(org_nr, '\D', '', 'g')
+        ELSE 'name:' || lower(btrim(regexp_replace(name, '\s+', ' ', 'g')))
+            || '|' || regexp_replace(coalesce(postal_code, ''), '\s', '', 'g')
+    END
+$$;
+
+ALTER TABLE customers
+    ADD COLUMN natural_key TEXT GENERATED ALWAYS AS (customer_natural_key(org_nr, name, postal_code)) STORED;
+
+-- Not unique: customers created by hand may legitimately share a name and postal code
+CREATE INDEX IF NOT EXISTS idx_customers_natural_key ON customers(natural_key);
@@ -0,0 +1,3 @@
+-- Partial output of a running job (text generated so far), polled by the UI
+
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS progress TEXT;
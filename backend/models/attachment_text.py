@@ -0,0 +1,38 @@
+from db import get_cursor
+
+
+def find(content_hash: str, retry_failed_after: int | None = None) -> dict | None:
+    """Stored extraction for content_hash. With retry_failed_after, a failed
+    row older than that many seconds is treated as missing."""
+    with get_cursor() as cur:
+        if retry_failed_after is None:
+            cur.execute("SELECT * FROM attachment_texts WHERE content_hash = %s", (content_hash,))
+        else:
+            cur.execute(
+                """
+                SELECT * FROM attachment_texts
+                WHERE content_hash = %s
+                  AND (status = 'done' OR extracted_at > NOW() - make_interval(secs => %s))
+                """,
+                (content_hash, retry_failed_after),
+            )
+        return cur.fetchone()
+
+
+def put(content_hash: str, text: str | None, error: str | None = None) -> None:
+    status = "failed" if error else "done"
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO attachment_texts (content_hash, status, text, error)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (content_hash) DO UPDATE SET
+                status = EXCLUDED.status,
+                text = EXCLUDED.text,
+                error = EXCLUDED.error,
+                extracted_at = NOW()
+            -- A concurrent failed retry never overwrites a good extraction
+            WHERE EXCLUDED.status = 'done' OR attachment_texts.status = 'failed'
+            """,
+            (content_hash, status, text, error),
+        )
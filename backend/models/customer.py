@@ -1,5 +1,6 @@
 import csv
 import io
+import re
 from db import get_cursor
 
 
@@ -7,8 +8,8 @@ def create(name: str, customer_type: str, **kwargs) -> dict:
     with get_cursor() as cur:
         cur.execute(
             """
-            INSERT INTO customers (name, address, postal_code, city, contact_person, phone, email, customer_type)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO customers (name, address, postal_code, city, contact_person, phone, email, customer_type, org_nr)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             RETURNING *
             """,
             (
@@ -20,6 +21,7 @@ def create(name: str, customer_type: str, **kwargs) -> dict:
                 kwargs.get("phone"),
                 kwargs.get("email"),
                 customer_type,
+                kwargs.get("org_nr"),
             ),
         )
         return cur.fetchone()
@@ -31,26 +33,80 @@ def find_by_id(customer_id: int) -> dict | None:
         return cur.fetchone()
 
 
-def search(query: str | None = None, limit: int = 20) -> list[dict]:
-    if query:
+# Fields the customer picker uses to fill in the recipient
+PICKER_FIELDS = "id, name, address, postal_code, city, contact_person, phone, email, customer_type"
+
+
+def _like_prefix(query: str) -> str:
+    escaped = query.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _word_prefix_regex(query: str) -> str:
+    return r"\m" + re.escape(query)
+
+
+def search(query: str | None = None, limit: int = 20, exclude: list[int] | None = None,
+           fuzzy_only: bool = False) -> list[dict]:
+    """Typeahead: name prefix matches first, then word prefix (name or contact
+    person), then trigram similarity. Returns PICKER_FIELDS plus the tier.
+
+    fuzzy_only restricts to trigram matches that are not prefix matches, for
+    topping up results from the in-process index; exclude skips those ids.
+    """
+    if not query:
         with get_cursor() as cur:
-            cur.execute(
-                """
-                SELECT * FROM customers
-                WHERE name ILIKE %s OR contact_person ILIKE %s
-                ORDER BY name LIMIT %s
-                """,
-                (f"%{query}%", f"%{query}%", limit),
-            )
+            cur.execute(f"SELECT {PICKER_FIELDS} FROM customers ORDER BY name LIMIT %s", (limit,))
             return cur.fetchall()
+
+    params = {
+        "q": query,
+        "prefix": _like_prefix(query),
+        "word": _word_prefix_regex(query),
+        "exclude": exclude or [],
+        "limit": limit,
+    }
+    prefix_match = "lower(name) LIKE %(prefix)s"
+    word_match = "(name ~* %(word)s OR contact_person ~* %(word)s)"
+    fuzzy_match = "(name %% %(q)s OR contact_person %% %(q)s)"
+    if fuzzy_only:
+        where = f"{fuzzy_match} AND NOT {prefix_match} AND NOT coalesce({word_match}, false)"
     else:
-        with get_cursor() as cur:
-            cur.execute("SELECT * FROM customers ORDER BY name LIMIT %s", (limit,))
-            return cur.fetchall()
+        where = f"({prefix_match} OR {word_match} OR {fuzzy_match})"
+
+    with get_cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT {PICKER_FIELDS},
+                   CASE WHEN {prefix_match} THEN 0 WHEN {word_match} THEN 1 ELSE 2 END AS tier
+            FROM customers
+            WHERE {where} AND NOT (id = ANY(%(exclude)s))
+            ORDER BY tier,
+                     greatest(similarity(name, %(q)s), similarity(coalesce(contact_person, ''), %(q)s)) DESC,
+                     name
+            LIMIT %(limit)s
+            """,
+            params,
+        )
+        return cur.fetchall()
+
+
+def list_for_picker() -> list[dict]:
+    with get_cursor() as cur:
+        cur.execute(f"SELECT {PICKER_FIELDS} FROM customers")
+        return cur.fetchall()
+
+
+def change_marker() -> tuple:
+    """Cheap fingerprint that changes on any insert, update or delete."""
+    with get_cursor() as cur:
+        cur.execute("SELECT count(*) AS n, max(updated_at) AS updated, max(id) AS max_id FROM customers")
+        row = cur.fetchone()
+        return row["n"], row["updated"], row["max_id"]
 
 
 def update(customer_id: int, **kwargs) -> dict | None:
-    allowed = ["name", "address", "postal_code", "city", "contact_person", "phone", "email", "customer_type"]
+    allowed = ["name", "address", "postal_code", "city", "contact_person", "phone", "email", "customer_type", "org_nr"]
     sets = []
     values = []
     for key in allowed:
@@ -78,38 +134,212 @@ def delete(customer_id: int) -> bool:
         return cur.fetchone() is not None
 
 
-def import_csv(csv_text: str) -> int:
-    """Import customers from Drifti CSV export. Returns count of imported customers."""
-    reader = csv.DictReader(io.StringIO(csv_text))
-    count = 0
+# Staging columns, in COPY order
+_IMPORT_COLUMNS = (
+    "line", "name", "address", "postal_code", "city", "contact_person", "phone", "email",
+    "customer_type", "org_nr",
+)
+_IMPORT_BATCH_ROWS = 5000
+
+
+def _import_row(line: int, row: dict) -> list | None:
+    """Map a Drifti CSV row to staging columns, or None if it has no name."""
+    def field(*names: str) -> str | None:
+        for name in names:
+            value = row.get(name)
+            if value and value.strip():
+                return value.strip()
+        return None
+
+    name = field("Navn", "name")
+    if not name:
+        return None
+    org_nr = field("Org.nr", "org_nr")
+    return [
+        line, name,
+        field("Adresse", "address"),
+        field("Postnr", "postal_code"),
+        field("Poststed", "city"),
+        field("Kontaktperson", "contact_person"),
+        field("Telefon", "phone"),
+        field("E-post", "email"),
+        "business" if org_nr else "private",
+        org_nr,
+    ]
 
+
+def _copy_rows(cur, rows: list[list]) -> None:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY customer_import ({', '.join(_IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buf,
+    )
+
+
+def import_csv(stream) -> dict:
+    """Import customers from a Drifti CSV export (a text stream).
+
+    Rows are parsed as they are read and loaded in batches with COPY into a
+    staging table, then upserted on customer_natural_key: org number, or name
+    + postal code. Customers stored without an org number (everyone from
+    before org numbers were imported) are matched on name + postal code and
+    get the file's org number; rows without org number likewise update a
+    customer stored with one and keep its org number and customer type.
+    Empty cells keep the existing value. Returns counts of inserted, updated
+    and skipped rows (no name, repeated in the file, or unchanged).
+    """
+    total = 0
     with get_cursor() as cur:
-        for row in reader:
-            # Map Drifti CSV columns to our schema
-            name = row.get("Navn", row.get("name", "")).strip()
-            if not name:
-                continue
-
-            # Determine customer type from organization number or similar
-            customer_type = "business" if row.get("Org.nr", row.get("org_nr", "")).strip() else "private"
-
-            cur.execute(
-                """
-                INSERT INTO customers (name, address, postal_code, city, contact_person, phone, email, customer_type)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-                """,
-                (
-                    name,
-                    row.get("Adresse", row.get("address", "")).strip() or None,
-                    row.get("Postnr", row.get("postal_code", "")).strip() or None,
-                    row.get("Poststed", row.get("city", "")).strip() or None,
-                    row.get("Kontaktperson", row.get("contact_person", "")).strip() or None,
-                    row.get("Telefon", row.get("phone", "")).strip() or None,
-                    row.get("E-post", row.get("email", "")).strip() or None,
-                    customer_type,
-                ),
+        cur.execute(
+            """
+            CREATE TEMP TABLE customer_import (
+                line INTEGER, name TEXT, address TEXT, postal_code TEXT, city TEXT,
+                contact_person TEXT, phone TEXT, email TEXT, customer_type TEXT, org_nr TEXT
+            ) ON COMMIT DROP
+            """
+        )
+
+        batch = []
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            total += 1
+            staged = _import_row(line, row)
+            if staged:
+                batch.append(staged)
+            if len(batch) >= _IMPORT_BATCH_ROWS:
+                _copy_rows(cur, batch)
+                batch = []
+        if batch:
+            _copy_rows(cur, batch)
+
+        # Serialize imports so two of them cannot insert the same new customer
+        cur.execute("LOCK TABLE customers IN SHARE ROW EXCLUSIVE MODE")
+
+        # Last row wins when the file repeats a customer
+        cur.execute(
+            """
+            CREATE TEMP TABLE customer_import_unique ON COMMIT DROP AS
+            SELECT DISTINCT ON (natural_key) *
+            FROM (
+                SELECT i.*, customer_natural_key(i.org_nr, i.name, i.postal_code) AS natural_key
+                FROM customer_import i
+            ) keyed
+            ORDER BY natural_key, line DESC
+            """
+        )
+
+        # An org row has no org-keyed match yet but a legacy row without org
+        # number shares its name + postal code: give that row the org number, so
+        # it is updated below instead of inserted again. One row per org number.
+        cur.execute(
+            """
+            WITH candidates AS (
+                SELECT DISTINCT ON (s.natural_key) s.natural_key, s.org_nr, c.id
+                FROM customer_import_unique s
+                JOIN customers c
+                  ON c.org_nr IS NULL
+                 AND c.natural_key = customer_natural_key(NULL, s.name, s.postal_code)
+                WHERE starts_with(s.natural_key, 'org:')
+                  AND NOT EXISTS (SELECT 1 FROM customers o WHERE o.natural_key = s.natural_key)
+                ORDER BY s.natural_key, c.id
+            ), claimed AS (
+                SELECT DISTINCT ON (id) * FROM candidates ORDER BY id, natural_key
+            )
+            UPDATE customers c SET org_nr = claimed.org_nr, updated_at = NOW()
+            FROM claimed
+            WHERE c.id = claimed.id
+            RETURNING claimed.natural_key
+            """
+        )
+        matched = [r["natural_key"] for r in cur.fetchall()]
+
+        # The other way round: a row without org number whose name + postal
+        # code belongs to a customer stored with one. Update that customer and
+        # keep its org number and customer type.
+        cur.execute(
+            """
+            CREATE TEMP TABLE customer_import_by_name ON COMMIT DROP AS
+            SELECT DISTINCT ON (s.natural_key) s.natural_key, c.id
+            FROM customer_import_unique s
+            JOIN customers c
+              ON starts_with(c.natural_key, 'org:')
+             AND customer_natural_key(NULL, c.name, c.postal_code) = s.natural_key
+            WHERE starts_with(s.natural_key, 'name:')
+              AND NOT EXISTS (SELECT 1 FROM customers o WHERE o.natural_key = s.natural_key)
+            ORDER BY s.natural_key, c.id
+            """
+        )
+        cur.execute(
+            """
+            UPDATE customers c SET
+                name = s.name,
+                address = coalesce(s.address, c.address),
+                postal_code = coalesce(s.postal_code, c.postal_code),
+                city = coalesce(s.city, c.city),
+                contact_person = coalesce(s.contact_person, c.contact_person),
+                phone = coalesce(s.phone, c.phone),
+                email = coalesce(s.email, c.email),
+                updated_at = NOW()
+            FROM customer_import_by_name m
+            JOIN customer_import_unique s USING (natural_key)
+            WHERE c.id = m.id
+              AND (c.name, c.address, c.postal_code, c.city, c.contact_person, c.phone, c.email)
+                  IS DISTINCT FROM
+                  (s.name, coalesce(s.address, c.address), coalesce(s.postal_code, c.postal_code),
+                   coalesce(s.city, c.city), coalesce(s.contact_person, c.contact_person),
+                   coalesce(s.phone, c.phone), coalesce(s.email, c.email))
+            RETURNING s.natural_key
+            """
+        )
+        matched += [r["natural_key"] for r in cur.fetchall()]
+
+        cur.execute(
+            """
+            WITH changed AS (
+                UPDATE customers c SET
+                    name = s.name,
+                    address = coalesce(s.address, c.address),
+                    postal_code = coalesce(s.postal_code, c.postal_code),
+                    city = coalesce(s.city, c.city),
+                    contact_person = coalesce(s.contact_person, c.contact_person),
+                    phone = coalesce(s.phone, c.phone),
+                    email = coalesce(s.email, c.email),
+                    customer_type = s.customer_type,
+                    org_nr = coalesce(s.org_nr, c.org_nr),
+                    updated_at = NOW()
+                FROM customer_import_unique s
+                WHERE c.natural_key = s.natural_key
+                  AND (c.name, c.address, c.postal_code, c.city, c.contact_person, c.phone, c.email,
+                       c.customer_type, c.org_nr)
+                      IS DISTINCT FROM
+                      (s.name, coalesce(s.address, c.address), coalesce(s.postal_code, c.postal_code),
+                       coalesce(s.city, c.city), coalesce(s.contact_person, c.contact_person),
+                       coalesce(s.phone, c.phone), coalesce(s.email, c.email),
+                       s.customer_type, coalesce(s.org_nr, c.org_nr))
+                RETURNING s.natural_key
             )
-            count += 1
+            SELECT count(*) AS n FROM (
+                SELECT natural_key FROM changed
+                UNION
+                SELECT unnest(%s::text[])
+            ) keys
+            """,
+            (matched,),
+        )
+        updated = cur.fetchone()["n"]
+
+        cur.execute(
+            """
+            INSERT INTO customers (name, address, postal_code, city, contact_person, phone, email,
+                                   customer_type, org_nr)
+            SELECT s.name, s.address, s.postal_code, s.city, s.contact_person, s.phone, s.email,
+                   s.customer_type, s.org_nr
+            FROM customer_import_unique s
+            WHERE NOT EXISTS (SELECT 1 FROM customers c WHERE c.natural_key = s.natural_key)
+              AND NOT EXISTS (SELECT 1 FROM customer_import_by_name m WHERE m.natural_key = s.natural_key)
+            """
+        )
+        inserted = cur.rowcount
 
-    return count
+    return {"inserted": inserted, "updated": updated, "skipped": total - inserted - updated}
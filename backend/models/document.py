@@ -26,33 +26,117 @@ def create(user_id: int, document_type: str, document_name: str, **kwargs) -> di
         return cur.fetchone()
 
 
-def find_by_id(doc_id: int) -> dict | None:
+def find_by_id(doc_id: int, for_update: bool = False) -> dict | None:
+    """Fetch a document. for_update also row-locks it until the transaction
+    ends (use inside db.unit_of_work before changing its status)."""
     with get_cursor() as cur:
-        cur.execute("SELECT * FROM documents WHERE id = %s", (doc_id,))
+        cur.execute(f"SELECT * FROM documents WHERE id = %s{' FOR UPDATE' if for_update else ''}", (doc_id,))
         return cur.fetchone()
 
 
-def list_by_user(user_id: int, search: str | None = None, doc_type: str | None = None, admin: bool = False) -> list[dict]:
-    if admin:
-        query = "SELECT * FROM documents WHERE status = 'finalized'"
-        params: list = []
-    else:
-        query = "SELECT * FROM documents WHERE user_id = %s AND status = 'finalized'"
-        params: list = [user_id]
+# Columns a list request may select with fields=
+LISTABLE_FIELDS = (
+    "id", "user_id", "customer_id", "document_type", "document_name",
+    "recipient_name", "recipient_address", "recipient_postal_code", "recipient_city",
+    "recipient_person", "recipient_phone", "recipient_email", "customer_type",
+    "price_product", "price_installation", "document_text", "ai_prompt", "ai_model",
+    "status", "file_path_word", "file_path_word_signed", "file_path_pdf",
+    "file_path_pdf_signed", "file_path_attachment", "created_at", "updated_at", "finalized_at",
+)
 
-    if search:
-        query += " AND (document_name ILIKE %s OR recipient_name ILIKE %s)"
-        params.extend([f"%{search}%", f"%{search}%"])
+# Default list projection: everything the dashboard shows, no large text columns
+LIST_FIELDS = (
+    "id", "user_id", "customer_id", "document_type", "document_name",
+    "recipient_name", "recipient_city", "customer_type", "status",
+    "file_path_word", "file_path_word_signed", "file_path_pdf", "file_path_pdf_signed",
+    "created_at", "updated_at", "finalized_at",
+)
+
+
+# ts_headline markers; the client turns them into highlights
+HIGHLIGHT_START = "\u27e6"
+HIGHLIGHT_STOP = "\u27e7"
 
+
+def list_by_user(user_id: int, search: str | None = None, doc_type: str | None = None, admin: bool = False,
+                 limit: int = 50, after: tuple | None = None,
+                 fields: list[str] | None = None) -> tuple[list[dict], tuple | None]:
+    """One page of finalized documents.
+
+    Without search, newest first and after is the (updated_at, id) of the
+    last row of the previous page. With search, best match first (full text
+    over name, recipient and body, plus trigram similarity on name and
+    recipient for typos), each row has rank and a highlighted headline, and
+    after is (rank, id). Returns the rows and the key for the next page, or
+    None on the last page. fields must be a subset of LISTABLE_FIELDS.
+    """
+    columns = list(fields or LIST_FIELDS)
+    for key in ("id", "updated_at"):  # needed for the next page key
+        if key not in columns:
+            columns.append(key)
+
+    where = ["d.status = 'finalized'"]
+    params: dict = {"limit": limit + 1}
+    if not admin:
+        where.append("d.user_id = %(user_id)s")
+        params["user_id"] = user_id
     if doc_type:
-        query += " AND document_type = %s"
-        params.append(doc_type)
+        where.append("d.document_type = %(doc_type)s")
+        params["doc_type"] = doc_type
 
-    query += " ORDER BY updated_at DESC"
+    select = ", ".join(f"d.{c}" for c in columns)
+    if search:
+        params["search"] = search
+        params["headline_options"] = (
+            f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MaxWords=20, MinWords=5"
+        )
+        if after:
+            params["after_rank"], params["after_id"] = after
+        query = f"""
+            WITH q AS (SELECT websearch_to_tsquery('norwegian', %(search)s) AS query),
+            matches AS (
+                SELECT {select},
+                       (ts_rank_cd(d.search_tsv, q.query)
+                        + greatest(word_similarity(%(search)s, d.document_name),
+                                   word_similarity(%(search)s, coalesce(d.recipient_name, ''))))::float8 AS rank
+                FROM documents d, q
+                WHERE {' AND '.join(where)}
+                  AND (d.search_tsv @@ q.query
+                       OR %(search)s <%% d.document_name
+                       OR %(search)s <%% d.recipient_name)
+            ), page AS (
+                SELECT * FROM matches
+                {"WHERE (rank, id) < (%(after_rank)s, %(after_id)s)" if after else ""}
+                ORDER BY rank DESC, id DESC
+                LIMIT %(limit)s
+            )
+            SELECT page.*,
+                   ts_headline('norwegian', coalesce(body.document_text, ''), q.query, %(headline_options)s) AS headline
+            FROM page
+            JOIN documents body ON body.id = page.id
+            CROSS JOIN q
+            ORDER BY page.rank DESC, page.id DESC
+        """
+    else:
+        if after:
+            where.append("(d.updated_at, d.id) < (%(after_updated)s, %(after_id)s)")
+            params["after_updated"], params["after_id"] = after
+        query = f"""
+            SELECT {select} FROM documents d
+            WHERE {' AND '.join(where)}
+            ORDER BY d.updated_at DESC, d.id DESC
+            LIMIT %(limit)s
+        """
 
     with get_cursor() as cur:
         cur.execute(query, params)
-        return cur.fetchall()
+        rows = cur.fetchall()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, ((last["rank"] if search else last["updated_at"]), last["id"])
 
 
 def update(doc_id: int, **kwargs) -> dict | None:
@@ -118,6 +202,16 @@ def set_status(doc_id: int, new_status: str, expected: list[str] | None = None)
         return cur.fetchone() is not None
 
 
+def rename(doc_id: int, document_name: str, expected_name: str) -> bool:
+    """Set the name unless it has changed from expected_name in the meantime."""
+    with get_cursor() as cur:
+        cur.execute(
+            "UPDATE documents SET document_name = %s, updated_at = NOW() WHERE id = %s AND document_name = %s RETURNING id",
+            (document_name, doc_id, expected_name),
+        )
+        return cur.fetchone() is not None
+
+
 def delete(doc_id: int) -> dict | None:
     with get_cursor() as cur:
         cur.execute("DELETE FROM documents WHERE id = %s RETURNING *", (doc_id,))
@@ -0,0 +1,53 @@
+import json
+from db import get_cursor
+
+
+def get(cache_key: str, ttl_seconds: int) -> list[float] | None:
+    """Return a cached embedding that is younger than ttl_seconds and mark it used."""
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            UPDATE embedding_cache SET last_used_at = NOW()
+            WHERE cache_key = %s AND created_at > NOW() - make_interval(secs => %s)
+            RETURNING embedding::text AS embedding
+            """,
+            (cache_key, ttl_seconds),
+        )
+        row = cur.fetchone()
+        return json.loads(row["embedding"]) if row else None
+
+
+def put(cache_key: str, model: str, embedding: list[float]) -> None:
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO embedding_cache (cache_key, model, embedding)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (cache_key) DO UPDATE SET
+                embedding = EXCLUDED.embedding,
+                created_at = NOW(),
+                last_used_at = NOW()
+            """,
+            (cache_key, model, str(embedding)),
+        )
+
+
+def evict(ttl_seconds: int, max_rows: int) -> int:
+    """Delete expired entries and the least recently used ones beyond max_rows."""
+    with get_cursor() as cur:
+        cur.execute(
+            "DELETE FROM embedding_cache WHERE created_at <= NOW() - make_interval(secs => %s)",
+            (ttl_seconds,),
+        )
+        deleted = cur.rowcount
+        cur.execute(
+            """
+            DELETE FROM embedding_cache WHERE cache_key IN (
+                SELECT cache_key FROM embedding_cache
+                ORDER BY last_used_at DESC
+                OFFSET %s
+            )
+            """,
+            (max_rows,),
+        )
+        return deleted + cur.rowcount
@@ -0,0 +1,39 @@
+from db import get_cursor
+
+
+def get(cache_key: str, ttl_seconds: int) -> dict | None:
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            SELECT text, subject, model, provider FROM generation_cache
+            WHERE cache_key = %s AND created_at > NOW() - make_interval(secs => %s)
+            """,
+            (cache_key, ttl_seconds),
+        )
+        return cur.fetchone()
+
+
+def put(cache_key: str, text: str, subject: str | None, model: str, provider: str) -> None:
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO generation_cache (cache_key, text, subject, model, provider)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (cache_key) DO UPDATE SET
+                text = EXCLUDED.text,
+                subject = EXCLUDED.subject,
+                model = EXCLUDED.model,
+                provider = EXCLUDED.provider,
+                created_at = NOW()
+            """,
+            (cache_key, text, subject, model, provider),
+        )
+
+
+def purge_expired(ttl_seconds: int) -> int:
+    with get_cursor() as cur:
+        cur.execute(
+            "DELETE FROM generation_cache WHERE created_at <= NOW() - make_interval(secs => %s)",
+            (ttl_seconds,),
+        )
+        return cur.rowcount
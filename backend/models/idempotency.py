@@ -0,0 +1,59 @@
+import json
+from db import get_cursor
+
+
+def reserve(user_id: int, key: str, request_hash: str, lease_seconds: int) -> dict | None:
+    """Claim key for a new request. Returns None if claimed, else the existing entry.
+
+    The claim expires after lease_seconds unless complete() stores a response,
+    so a key held by a request that died is freed again.
+    """
+    with get_cursor() as cur:
+        cur.execute(
+            "DELETE FROM idempotency_keys WHERE user_id = %s AND idempotency_key = %s AND expires_at <= NOW()",
+            (user_id, key),
+        )
+        cur.execute(
+            """
+            INSERT INTO idempotency_keys (user_id, idempotency_key, request_hash, expires_at)
+            VALUES (%s, %s, %s, NOW() + make_interval(secs => %s))
+            ON CONFLICT (user_id, idempotency_key) DO NOTHING
+            RETURNING user_id
+            """,
+            (user_id, key, request_hash, lease_seconds),
+        )
+        if cur.fetchone():
+            return None
+        cur.execute(
+            "SELECT * FROM idempotency_keys WHERE user_id = %s AND idempotency_key = %s",
+            (user_id, key),
+        )
+        return cur.fetchone()
+
+
+def complete(user_id: int, key: str, status: int, body: str, headers: dict, ttl_seconds: int) -> None:
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            UPDATE idempotency_keys SET
+                status = 'done', response_status = %s, response_body = %s, response_headers = %s,
+                expires_at = NOW() + make_interval(secs => %s)
+            WHERE user_id = %s AND idempotency_key = %s
+            """,
+            (status, body, json.dumps(headers), ttl_seconds, user_id, key),
+        )
+
+
+def release(user_id: int, key: str) -> None:
+    """Forget a key whose request failed, so the client can retry with it."""
+    with get_cursor() as cur:
+        cur.execute(
+            "DELETE FROM idempotency_keys WHERE user_id = %s AND idempotency_key = %s AND status = 'in_progress'",
+            (user_id, key),
+        )
+
+
+def purge_expired() -> int:
+    with get_cursor() as cur:
+        cur.execute("DELETE FROM idempotency_keys WHERE expires_at <= NOW()")
+        return cur.rowcount
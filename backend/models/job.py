@@ -0,0 +1,107 @@
+import json
+from db import get_cursor
+
+
+def create(job_type: str, payload: dict, user_id: int | None = None, document_id: int | None = None,
+           max_attempts: int = 1) -> dict:
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO jobs (job_type, payload, user_id, document_id, max_attempts)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING *
+            """,
+            (job_type, json.dumps(payload), user_id, document_id, max_attempts),
+        )
+        return cur.fetchone()
+
+
+def find_by_id(job_id: int) -> dict | None:
+    with get_cursor() as cur:
+        cur.execute("SELECT * FROM jobs WHERE id = %s", (job_id,))
+        return cur.fetchone()
+
+
+def claim_next(job_types: list[str], stale_after: int) -> dict | None:
+    """Claim the oldest runnable job. Jobs left 'running' by a dead worker are
+    reclaimed after stale_after seconds if they have attempts left."""
+    placeholders = ", ".join(["%s"] * len(job_types))
+    with get_cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE jobs SET
+                status = 'running',
+                attempts = attempts + 1,
+                locked_at = NOW(),
+                started_at = NOW()
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE job_type IN ({placeholders})
+                  AND (
+                    status = 'queued'
+                    OR (status = 'running' AND locked_at < NOW() - make_interval(secs => %s)
+                        AND attempts < max_attempts)
+                  )
+                ORDER BY created_at
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+            """,
+            job_types + [stale_after],
+        )
+        return cur.fetchone()
+
+
+def set_progress(job_id: int, progress: str) -> None:
+    with get_cursor() as cur:
+        cur.execute(
+            "UPDATE jobs SET progress = %s WHERE id = %s AND status = 'running'",
+            (progress, job_id),
+        )
+
+
+def complete(job_id: int, result: dict | None = None) -> None:
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            UPDATE jobs SET status = 'done', result = %s, error = NULL, progress = NULL, finished_at = NOW()
+            WHERE id = %s
+            """,
+            (json.dumps(result) if result is not None else None, job_id),
+        )
+
+
+def fail(job_id: int, error: str) -> dict | None:
+    """Record a failed attempt. Requeues the job if it has attempts left."""
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            UPDATE jobs SET
+                status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                error = %s,
+                progress = NULL,
+                locked_at = NULL,
+                finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE NOW() END
+            WHERE id = %s
+            RETURNING *
+            """,
+            (error, job_id),
+        )
+        return cur.fetchone()
+
+
+def fail_stale(stale_after: int) -> list[dict]:
+    """Mark jobs abandoned by a dead worker with no attempts left as failed."""
+    with get_cursor() as cur:
+        cur.execute(
+            """
+            UPDATE jobs SET status = 'failed', error = 'Jobben ble avbrutt', finished_at = NOW()
+            WHERE status = 'running'
+              AND locked_at < NOW() - make_interval(secs => %s)
+              AND attempts >= max_attempts
+            RETURNING *
+            """,
+            (stale_after,),
+        )
+        return cur.fetchall()
@@ -1,4 +1,8 @@
+import io
+import csv
+import json
 from db import get_cursor
+from config import Config
 
 
 def create_document(filename: str, category: str, description: str, uploaded_by: int) -> dict:
@@ -43,29 +47,85 @@ def get_chunks(doc_id: int) -> list[dict]:
         return cur.fetchall()
 
 
-def add_chunk(document_id: int, chunk_index: int, content: str, embedding: list[float], metadata: dict | None = None) -> None:
-    import json
+def _vector_literal(embedding: list[float]) -> str:
+    # pgvector stores float32, which needs 9 significant digits to round-trip exactly
+    return "[" + ",".join(f"{x:.9g}" for x in embedding) + "]"
+
+
+def add_chunks(document_id: int, chunks: list[tuple[int, str, list[float], dict | None]]) -> None:
+    """Insert (chunk_index, content, embedding, metadata) rows with one COPY in one transaction."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for chunk_index, content, embedding, metadata in chunks:
+        writer.writerow([
+            document_id,
+            chunk_index,
+            content,
+            _vector_literal(embedding),
+            json.dumps(metadata) if metadata else None,
+        ])
+    buf.seek(0)
+
     with get_cursor() as cur:
-        cur.execute(
+        cur.copy_expert(
             """
-            INSERT INTO knowledge_chunks (document_id, chunk_index, content, embedding, metadata)
-            VALUES (%s, %s, %s, %s, %s)
+            COPY knowledge_chunks (document_id, chunk_index, content, embedding, metadata)
+            FROM STDIN WITH (FORMAT csv)
             """,
-            (document_id, chunk_index, content, str(embedding), json.dumps(metadata) if metadata else None),
+            buf,
         )
 
 
 def search_by_embedding(embedding: list[float], limit: int = 5) -> list[dict]:
+    vector = _vector_literal(embedding)
+    with get_cursor() as cur:
+        # Per-transaction ANN recall/speed trade-off
+        cur.execute(
+            "SELECT set_config('hnsw.ef_search', %s, true), set_config('ivfflat.probes', %s, true)",
+            (str(Config.VECTOR_EF_SEARCH), str(Config.VECTOR_PROBES)),
+        )
+        # Order knowledge_chunks alone so the HNSW index serves the LIMIT, then join
+        cur.execute(
+            """
+            WITH nearest AS (
+                SELECT id, document_id, content, metadata, embedding <=> %(vector)s::vector AS distance
+                FROM knowledge_chunks
+                ORDER BY embedding <=> %(vector)s::vector
+                LIMIT %(limit)s
+            )
+            SELECT n.id AS chunk_id, n.content, n.metadata, kd.filename, kd.category,
+                   1 - n.distance as similarity
+            FROM nearest n
+            JOIN knowledge_documents kd ON kd.id = n.document_id
+            ORDER BY n.distance
+            """,
+            {"vector": vector, "limit": limit},
+        )
+        return cur.fetchall()
+
+
+def search_by_text(query: str, limit: int = 5) -> list[dict]:
+    """Rank chunks matching any word of query (Norwegian stemming) by cover density."""
     with get_cursor() as cur:
+        # OR the query's lexemes together; a long prompt would rarely match all of them
         cur.execute(
             """
-            SELECT kc.content, kc.metadata, kd.filename, kd.category,
-                   1 - (kc.embedding <=> %s::vector) as similarity
-            FROM knowledge_chunks kc
-            JOIN knowledge_documents kd ON kd.id = kc.document_id
-            ORDER BY kc.embedding <=> %s::vector
-            LIMIT %s
+            WITH q AS (
+                SELECT to_tsquery('simple', string_agg(quote_literal(lexeme), ' | ')) AS query
+                FROM unnest(tsvector_to_array(to_tsvector('norwegian', %(query)s))) AS lexeme
+            ), ranked AS (
+                SELECT kc.id, kc.document_id, kc.content, kc.metadata,
+                       ts_rank_cd(kc.content_tsv, q.query, 1) AS rank
+                FROM knowledge_chunks kc, q
+                WHERE kc.content_tsv @@ q.query
+                ORDER BY rank DESC
+                LIMIT %(limit)s
+            )
+            SELECT r.id AS chunk_id, r.content, r.metadata, kd.filename, kd.category, r.rank
+            FROM ranked r
+            JOIN knowledge_documents kd ON kd.id = r.document_id
+            ORDER BY r.rank DESC
             """,
-            (str(embedding), str(embedding), limit),
+            {"query": query, "limit": limit},
         )
         return cur.fetchall()
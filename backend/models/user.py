@@ -1,6 +1,35 @@
+import time
+import threading
 import bcrypt
+from collections import OrderedDict
+from config import Config
 from db import get_cursor
 
+# Per-process cache of find_by_id rows: user_id -> (expires_at, row). Writes
+# here invalidate it; other processes see them within USER_CACHE_TTL.
+_cache: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+_lock = threading.Lock()
+_generation = 0
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _invalidate(user_id: int) -> None:
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.pop(user_id, None)
+        _stats["invalidations"] += 1
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters for this process."""
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_cache)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+    return stats
+
 
 def find_by_username(username: str) -> dict | None:
     with get_cursor() as cur:
@@ -9,9 +38,33 @@ def find_by_username(username: str) -> dict | None:
 
 
 def find_by_id(user_id: int) -> dict | None:
+    if Config.USER_CACHE_SIZE <= 0:
+        with get_cursor() as cur:
+            cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+            return cur.fetchone()
+
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry and entry[0] > now:
+            _cache.move_to_end(user_id)
+            _stats["hits"] += 1
+            return dict(entry[1])
+        _stats["misses"] += 1
+        generation = _generation
+
     with get_cursor() as cur:
         cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-        return cur.fetchone()
+        user = cur.fetchone()
+
+    with _lock:
+        # Skip the store if a write invalidated the cache while we were reading
+        if user and generation == _generation:
+            _cache[user_id] = (now + Config.USER_CACHE_TTL, dict(user))
+            _cache.move_to_end(user_id)
+            while len(_cache) > Config.USER_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return user
 
 
 def verify_password(plain: str, hashed: str) -> bool:
@@ -21,6 +74,7 @@ def verify_password(plain: str, hashed: str) -> bool:
 def update_last_login(user_id: int) -> None:
     with get_cursor() as cur:
         cur.execute("UPDATE users SET last_login = NOW() WHERE id = %s", (user_id,))
+    _invalidate(user_id)
 
 
 def list_all() -> list[dict]:
@@ -55,7 +109,9 @@ def update(user_id: int, display_name: str, email: str, role: str) -> dict | Non
             """,
             (display_name, email, role, user_id),
         )
-        return cur.fetchone()
+        updated = cur.fetchone()
+    _invalidate(user_id)
+    return updated
 
 
 def update_password(user_id: int, new_password: str) -> None:
@@ -65,9 +121,12 @@ def update_password(user_id: int, new_password: str) -> None:
             "UPDATE users SET password_hash = %s, updated_at = NOW() WHERE id = %s",
             (password_hash, user_id),
         )
+    _invalidate(user_id)
 
 
 def delete(user_id: int) -> bool:
     with get_cursor() as cur:
         cur.execute("DELETE FROM users WHERE id = %s RETURNING id", (user_id,))
-        return cur.fetchone() is not None
+        deleted = cur.fetchone() is not None
+    _invalidate(user_id)
+    return deleted
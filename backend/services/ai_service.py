@@ -1,22 +1,28 @@
-import os
+import re
+import time
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from config import Config
+from db import own_transaction
+from models import generation_cache as generation_cache_model
+from services import llm_clients, llm_router, prompt_registry
 
 logger = logging.getLogger(__name__)
 
-PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+GEMINI_MODEL = "gemini-2.5-pro"
 
-
-def _load_prompt(name: str) -> str:
-    path = os.path.join(PROMPT_DIR, f"{name}.txt")
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+# Attachment and knowledge base lookups for _build_user_prompt
+_context_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="context")
 
 
 def _build_system_prompt(doc: dict) -> str:
-    base = _load_prompt("base_system")
-    type_prompt = _load_prompt(doc["document_type"])
-    return f"{base}\n\n{type_prompt}"
+    return prompt_registry.get_system_prompt(doc["document_type"])
+
+
+def _claude_system(system_prompt: str) -> list[dict]:
+    """System prompt marked for Anthropic prompt caching."""
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
 
 
 def _build_user_prompt(doc: dict, user_prompt: str) -> str:
@@ -37,57 +43,54 @@ def _build_user_prompt(doc: dict, user_prompt: str) -> str:
     if doc.get("price_installation"):
         parts.append(f"Installasjonspris: {doc['price_installation']} kr")
 
-    # Include attachment content only for types that use it
+    # Attachment (only for types that use it) and knowledge base context are
+    # fetched concurrently; a stage that misses its budget is left out
+    stages = {"rag": (_get_rag_context, f"KVTAS bedriftsinformasjon {user_prompt}", Config.CONTEXT_RAG_BUDGET_MS)}
     if doc["document_type"] in ("omprofilering", "svar_paa_brev"):
-        attachment_text = _read_attachment(doc)
-        if attachment_text:
-            parts.append(f"\n--- Vedlagt dokument ---\n{attachment_text}\n--- Slutt vedlegg ---")
+        stages["attachment"] = (_read_attachment, doc, Config.CONTEXT_ATTACHMENT_BUDGET_MS)
+    context = _gather_context(stages)
 
-    # Include RAG context from knowledge base for all document types
-    rag_query = f"KVTAS bedriftsinformasjon {user_prompt}"
-    rag_context = _get_rag_context(rag_query)
+    attachment_text = context.get("attachment")
+    if attachment_text:
+        parts.append(f"\n--- Vedlagt dokument ---\n{attachment_text}\n--- Slutt vedlegg ---")
+
+    rag_context = context.get("rag")
     if rag_context:
         parts.append(f"\n--- Relevant informasjon fra kunnskapsbasen ---\n{rag_context}\n--- Slutt kunnskapsbase ---")
 
     if user_prompt:
         parts.append(f"\nBrukerens instruksjon:\n{user_prompt}")
 
-    return "\n".join(parts)
+    parts.append(_subject_instruction(doc))
 
+    return "\n".join(parts)
 
-def _read_attachment(doc: dict) -> str | None:
-    path = doc.get("file_path_attachment")
-    if not path or not os.path.exists(path):
-        return None
 
-    ext = path.rsplit(".", 1)[-1].lower() if "." in path else ""
+def _gather_context(stages: dict) -> dict:
+    """Run {name: (fn, arg, budget_ms)} concurrently and return {name: result}.
 
-    if ext == "pdf":
-        try:
-            import subprocess
-            result = subprocess.run(
-                ["pdftotext", path, "-"],
-                capture_output=True, text=True, timeout=30,
-            )
-            return result.stdout if result.returncode == 0 else None
-        except Exception:
-            logger.warning("Could not extract text from PDF: %s", path)
-            return None
+    Budgets count from the same start, so the wait is the slowest stage that
+    makes it, not the sum. Stages that time out or fail are omitted.
+    """
+    start = time.monotonic()
+    futures = {name: (_context_executor.submit(fn, arg), budget_ms) for name, (fn, arg, budget_ms) in stages.items()}
 
-    if ext in ("doc", "docx"):
+    results = {}
+    for name, (future, budget_ms) in futures.items():
+        remaining = start + budget_ms / 1000 - time.monotonic()
         try:
-            from docx import Document as DocxDocument
-            doc_file = DocxDocument(path)
-            return "\n".join(p.text for p in doc_file.paragraphs)
+            results[name] = future.result(timeout=max(0.0, remaining))
+        except FutureTimeout:
+            logger.warning("Context stage %s exceeded %d ms, leaving it out", name, budget_ms)
         except Exception:
-            logger.warning("Could not extract text from DOCX: %s", path)
-            return None
+            logger.warning("Context stage %s failed, leaving it out", name, exc_info=True)
+    logger.debug("Context assembled in %.0f ms", (time.monotonic() - start) * 1000)
+    return results
 
-    if ext in ("txt", "csv"):
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
 
-    return None
+def _read_attachment(doc: dict) -> str | None:
+    from services.attachment_service import get_text
+    return get_text(doc.get("file_path_attachment"))
 
 
 def _get_rag_context(query: str) -> str | None:
@@ -101,80 +104,277 @@ def _get_rag_context(query: str) -> str | None:
     return None
 
 
-def generate_document_name(doc: dict, generated_text: str) -> str:
-    """Generate a document name based on type, customer and content."""
+# Question answered by the short subject used in the document name
+SUBJECT_QUESTIONS = {
+    "tilbud": "Hva er produktet/tjenesten det gis tilbud på? Svar med maks 5 ord.",
+    "brev": "Hva handler brevet om? Svar med maks 5 ord.",
+    "notat": "Hva handler notatet om? Svar med maks 5 ord.",
+    "omprofilering": "Hva er produktet/tjenesten det gis tilbud på? Svar med maks 5 ord.",
+    "svar_paa_brev": "Hva handler brevet om? Svar med maks 5 ord.",
+    "serviceavtale": "Hva slags anlegg gjelder serviceavtalen? Svar med maks 5 ord.",
+}
+
+# The generation call ends its answer with this line; it is cut from the text
+SUBJECT_MARKER = "EMNE:"
+
+
+def _subject_instruction(doc: dict) -> str:
+    return (
+        f"\nAvslutt svaret med én egen linje på formen «{SUBJECT_MARKER} <emne>», der emnet svarer på: "
+        f"{SUBJECT_QUESTIONS[doc['document_type']]} Linjen fjernes før dokumentet vises."
+    )
+
+
+# The marker line, tolerating Markdown emphasis: "EMNE: x", "**EMNE:** x", "_Emne_: x"
+_MARKER_RE = re.compile(r"^[\s*_]*EMNE[\s*_]*:[\s*_]*(.*?)[\s*_]*$", re.IGNORECASE)
+
+
+def _clean_subject(subject: str) -> str | None:
+    subject = subject.strip().strip("*_").strip().rstrip(".").strip("«»\"'").strip().rstrip(".")
+    return " ".join(subject.split()[:8]) or None
+
+
+def _may_be_marker(partial: str) -> bool:
+    """Whether an incomplete line could still turn out to be the marker line."""
+    compact = re.sub(r"[\s*_]", "", partial).upper()
+    return SUBJECT_MARKER.startswith(compact) or bool(_MARKER_RE.match(partial))
+
+
+class _SubjectFilter:
+    """Passes generated text through while holding back the trailing subject line.
+
+    Only the last non-empty line counts as the marker (or the last two, when
+    the marker line itself is empty and the subject follows on the next
+    line), so an "Emne: ..." line in the body stays in the text. Text is
+    released as soon as it cannot be part of that trailing block, so
+    streaming stays live; only blank lines, a line that looks like the
+    marker and the line after an empty marker are held until more text
+    shows what they are.
+    """
+
+    def __init__(self):
+        self._line = ""             # incomplete line, held back
+        self._mid_line = False      # the incomplete line has already been released
+        self._held = ""             # complete lines held back
+        self._subject: str | None = None   # set while _held ends with a marker candidate
+        self._awaiting_value = False       # the candidate was "EMNE:" alone
+
+    def _release(self) -> str:
+        held, self._held = self._held, ""
+        self._subject = None
+        self._awaiting_value = False
+        return held
+
+    def _complete(self, line: str, out: list[str]) -> None:
+        stripped = line.strip()
+        if not stripped:
+            self._held += line
+            return
+        if self._awaiting_value:
+            # Line after a bare "EMNE:"; it is the subject if nothing else follows
+            self._held += line
+            self._subject = stripped
+            self._awaiting_value = False
+            return
+        match = _MARKER_RE.match(stripped)
+        if match:
+            if self._subject is not None:
+                out.append(self._release())  # the earlier candidate was body text after all
+            self._held += line  # with any blank lines before it
+            self._subject = match.group(1)
+            self._awaiting_value = not match.group(1)
+            return
+        out.append(self._release())
+        out.append(line)
+
+    def feed(self, text: str) -> str:
+        out: list[str] = []
+        buf, self._line = self._line + text, ""
+        while buf:
+            nl = buf.find("\n")
+            if self._mid_line:
+                chunk = buf if nl < 0 else buf[:nl + 1]
+                out.append(chunk)
+                self._mid_line = nl < 0
+                buf = buf[len(chunk):]
+                continue
+            if nl < 0:
+                if not buf.strip() or self._awaiting_value or _may_be_marker(buf):
+                    self._line = buf
+                else:
+                    out.append(self._release())
+                    out.append(buf)
+                    self._mid_line = True
+                break
+            self._complete(buf[:nl + 1], out)
+            buf = buf[nl + 1:]
+        return "".join(out)
+
+    def finish(self) -> tuple[str, str | None]:
+        """Return any text still held back and the subject, if one was given."""
+        out: list[str] = []
+        if self._line:
+            line, self._line = self._line, ""
+            if self._mid_line:
+                out.append(line)
+            else:
+                self._complete(line, out)
+        if self._subject is None and not self._awaiting_value:
+            return "".join(out) + self._release(), None
+        subject = _clean_subject(self._subject or "")
+        self._release()
+        return "".join(out), subject
+
+
+def _split_subject(text: str) -> tuple[str, str | None]:
+    """Split generated text into (body, subject)."""
+    subject_filter = _SubjectFilter()
+    body = subject_filter.feed(text)
+    rest, subject = subject_filter.finish()
+    return body + rest, subject
+
+
+def format_document_name(doc: dict, subject: str) -> str:
     from datetime import date
 
     date_str = date.today().strftime("%d.%m.%Y")
     doc_type = doc["document_type"]
     customer = doc.get("recipient_name") or ""
 
-    # Ask the AI for a short subject (product/topic)
-    type_instructions = {
-        "tilbud": "Hva er produktet/tjenesten det gis tilbud på? Svar med maks 5 ord.",
-        "brev": "Hva handler brevet om? Svar med maks 5 ord.",
-        "notat": "Hva handler notatet om? Svar med maks 5 ord.",
-        "omprofilering": "Hva er produktet/tjenesten det gis tilbud på? Svar med maks 5 ord.",
-        "svar_paa_brev": "Hva handler brevet om? Svar med maks 5 ord.",
-        "serviceavtale": "Hva slags anlegg gjelder serviceavtalen? Svar med maks 5 ord.",
+    templates = {
+        "tilbud": f"{date_str} - Tilbud på {subject} til {customer}" if customer else f"{date_str} - Tilbud på {subject}",
+        "brev": f"{date_str} - Brev til {customer} vedr. {subject}" if customer else f"{date_str} - Brev vedr. {subject}",
+        "notat": f"{date_str} - Notat vedr. {subject}",
+        "omprofilering": f"{date_str} - Tilbud på {subject} til {customer}" if customer else f"{date_str} - Tilbud på {subject}",
+        "svar_paa_brev": f"{date_str} - Svar til {customer} vedr. {subject}" if customer else f"{date_str} - Svar vedr. {subject}",
+        "serviceavtale": f"{date_str} - Serviceavtale {subject} for {customer}" if customer else f"{date_str} - Serviceavtale {subject}",
     }
 
-    subject = ""
+    return templates.get(doc_type, f"{date_str} - {subject}")
+
+
+def generate_document_name(doc: dict, generated_text: str) -> str:
+    """Name a document with a separate Haiku call.
+
+    Fallback for when the generation call did not return a subject; runs as a
+    name_document job, off the request path.
+    """
     try:
-        import anthropic
-        client = anthropic.Anthropic(timeout=30.0)
-        resp = client.messages.create(
+        resp = llm_clients.anthropic_client().messages.create(
             model="claude-haiku-4-5-20251001",
             max_tokens=50,
+            timeout=30.0,
             messages=[{
                 "role": "user",
-                "content": f"{type_instructions[doc_type]}\n\nTekst:\n{generated_text[:1000]}",
+                "content": f"{SUBJECT_QUESTIONS[doc['document_type']]}\n\nTekst:\n{generated_text[:1000]}",
             }],
         )
-        subject = resp.content[0].text.strip().rstrip(".")
+        subject = _clean_subject(resp.content[0].text) or "diverse"
     except Exception:
         logger.warning("Could not generate document subject, using fallback")
         subject = "diverse"
 
-    templates = {
-        "tilbud": f"{date_str} - Tilbud på {subject} til {customer}" if customer else f"{date_str} - Tilbud på {subject}",
-        "brev": f"{date_str} - Brev til {customer} vedr. {subject}" if customer else f"{date_str} - Brev vedr. {subject}",
-        "notat": f"{date_str} - Notat vedr. {subject}",
-        "omprofilering": f"{date_str} - Tilbud på {subject} til {customer}" if customer else f"{date_str} - Tilbud på {subject}",
-        "svar_paa_brev": f"{date_str} - Svar til {customer} vedr. {subject}" if customer else f"{date_str} - Svar vedr. {subject}",
-        "serviceavtale": f"{date_str} - Serviceavtale {subject} for {customer}" if customer else f"{date_str} - Serviceavtale {subject}",
-    }
+    return format_document_name(doc, subject)
 
-    return templates.get(doc_type, f"{date_str} - {subject}")
+
+def _generation_cache_key(system_prompt: str, full_prompt: str) -> str:
+    # The user prompt already contains the attachment and retrieved context
+    return hashlib.sha256(f"{system_prompt}\0{full_prompt}".encode("utf-8")).hexdigest()
+
+
+def _cached_generation(cache_key: str) -> dict | None:
+    if not Config.GENERATION_CACHE:
+        return None
+    try:
+        with own_transaction():
+            cached = generation_cache_model.get(cache_key, Config.GENERATION_CACHE_TTL)
+    except Exception:
+        logger.warning("Generation cache lookup failed", exc_info=True)
+        return None
+    if not cached:
+        return None
+    logger.info("Generation cache hit")
+    return {**cached, "route_reason": "cache"}
+
+
+def _store_generation(cache_key: str, result: dict) -> None:
+    if not Config.GENERATION_CACHE:
+        return
+    try:
+        with own_transaction():
+            generation_cache_model.put(cache_key, result["text"], result["subject"], result["model"], result["provider"])
+    except Exception:
+        logger.warning("Could not store generation in cache", exc_info=True)
 
 
 def generate_document_text(doc: dict, user_prompt: str) -> dict:
-    """Generate document text using Claude (primary) or GPT (fallback)."""
+    """Generate document text on the healthiest provider (see services/llm_router.py)."""
     system_prompt = _build_system_prompt(doc)
     full_prompt = _build_user_prompt(doc, user_prompt)
 
-    # Try Claude first
-    try:
-        return _generate_with_claude(system_prompt, full_prompt)
-    except Exception as e:
-        logger.warning("Claude failed: %s. Falling back to GPT.", e)
+    cache_key = _generation_cache_key(system_prompt, full_prompt)
+    cached = _cached_generation(cache_key)
+    if cached:
+        return cached
+
+    result = llm_router.generate({
+        "claude": lambda: _generate_with_claude(system_prompt, full_prompt),
+        "gpt": lambda: _generate_with_gpt(system_prompt, full_prompt),
+        "gemini": lambda: _generate_with_gemini(system_prompt, full_prompt),
+    })
+    result["text"], result["subject"] = _split_subject(result["text"])
+    _store_generation(cache_key, result)
+    return result
+
+
+def stream_document_text(doc: dict, user_prompt: str):
+    """Stream document text as it is generated, falling back to the next provider on failure.
+
+    Yields (event, data) tuples: ("delta", text) for each piece of text,
+    ("reset", None) when falling back after a provider failed mid-stream,
+    and finally ("done", {"text", "subject", "model", "provider", "route_reason"}).
+    The subject line is held back from the deltas.
+    """
+    system_prompt = _build_system_prompt(doc)
+    full_prompt = _build_user_prompt(doc, user_prompt)
 
-    # Fallback to GPT
-    try:
-        return _generate_with_gpt(system_prompt, full_prompt)
-    except Exception as e:
-        logger.error("GPT also failed: %s", e)
-        raise RuntimeError("Kunne ikke generere tekst. Prøv igjen senere.") from e
+    cache_key = _generation_cache_key(system_prompt, full_prompt)
+    cached = _cached_generation(cache_key)
+    if cached:
+        yield "delta", cached["text"]
+        yield "done", cached
+        return
+
+    subject_filter = _SubjectFilter()
+    for event, payload in llm_router.stream({
+        "claude": lambda: _stream_with_claude(system_prompt, full_prompt),
+        "gpt": lambda: _stream_with_gpt(system_prompt, full_prompt),
+        "gemini": lambda: _stream_with_gemini(system_prompt, full_prompt),
+    }):
+        if event == "delta":
+            text = subject_filter.feed(payload)
+            if text:
+                yield "delta", text
+        elif event == "reset":
+            subject_filter = _SubjectFilter()
+            yield "reset", None
+        elif event == "done":
+            rest, _ = subject_filter.finish()
+            if rest:
+                yield "delta", rest
+            text, subject = _split_subject(payload["text"])
+            result = {**payload, "text": text, "subject": subject}
+            _store_generation(cache_key, result)
+            yield "done", result
 
 
 def _generate_with_claude(system_prompt: str, user_prompt: str) -> dict:
-    import anthropic
-    client = anthropic.Anthropic(timeout=120.0)
+    client = llm_clients.anthropic_client()
 
     response = client.messages.create(
         model="claude-sonnet-4-20250514",
         max_tokens=4096,
-        system=system_prompt,
+        system=_claude_system(system_prompt),
         messages=[{"role": "user", "content": user_prompt}],
     )
 
@@ -185,8 +385,7 @@ def _generate_with_claude(system_prompt: str, user_prompt: str) -> dict:
 
 
 def _generate_with_gpt(system_prompt: str, user_prompt: str) -> dict:
-    import openai
-    client = openai.OpenAI(timeout=120.0)
+    client = llm_clients.openai_client()
 
     response = client.chat.completions.create(
         model="gpt-4o",
@@ -201,3 +400,92 @@ def _generate_with_gpt(system_prompt: str, user_prompt: str) -> dict:
         "text": response.choices[0].message.content,
         "model": f"gpt:{response.model}",
     }
+
+
+def _generate_with_gemini(system_prompt: str, user_prompt: str) -> dict:
+    from google.genai import types
+    client = llm_clients.gemini_client()
+
+    response = client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=user_prompt,
+        config=types.GenerateContentConfig(system_instruction=system_prompt, max_output_tokens=4096),
+    )
+
+    return {
+        "text": response.text,
+        "model": f"gemini:{response.model_version or GEMINI_MODEL}",
+    }
+
+
+def _stream_with_claude(system_prompt: str, user_prompt: str):
+    client = llm_clients.anthropic_client()
+
+    parts = []
+    with client.messages.stream(
+        model="claude-sonnet-4-20250514",
+        max_tokens=4096,
+        system=_claude_system(system_prompt),
+        messages=[{"role": "user", "content": user_prompt}],
+    ) as stream:
+        for text in stream.text_stream:
+            parts.append(text)
+            yield "delta", text
+        message = stream.get_final_message()
+
+    yield "done", {
+        "text": "".join(parts),
+        "model": f"claude:{message.model}",
+    }
+
+
+def _stream_with_gpt(system_prompt: str, user_prompt: str):
+    client = llm_clients.openai_client()
+
+    stream = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        max_tokens=4096,
+        stream=True,
+    )
+
+    parts = []
+    model = "gpt-4o"
+    for chunk in stream:
+        model = chunk.model or model
+        if chunk.choices and chunk.choices[0].delta.content:
+            text = chunk.choices[0].delta.content
+            parts.append(text)
+            yield "delta", text
+
+    yield "done", {
+        "text": "".join(parts),
+        "model": f"gpt:{model}",
+    }
+
+
+def _stream_with_gemini(system_prompt: str, user_prompt: str):
+    from google.genai import types
+    client = llm_clients.gemini_client()
+
+    stream = client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=user_prompt,
+        config=types.GenerateContentConfig(system_instruction=system_prompt, max_output_tokens=4096),
+    )
+
+    parts = []
+    model = GEMINI_MODEL
+    for chunk in stream:
+        model = chunk.model_version or model
+        if chunk.text:
+            parts.append(chunk.text)
+            yield "delta", chunk.text
+
+    yield "done", {
+        "text": "".join(parts),
+        "model": f"gemini:{model}",
+    }
@@ -0,0 +1,187 @@
+"""Text extraction for uploaded attachments.
+
+Text is extracted once per file content, normally by an extract_attachment
+job queued at upload, and stored in attachment_texts keyed by sha256 of the
+file. Generation reads it back from there and only extracts inline for files
+uploaded before that job ran.
+"""
+import os
+import hashlib
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+from config import Config
+from models import attachment_text as attachment_text_model
+
+logger = logging.getLogger(__name__)
+
+EXTRACTABLE = {"pdf", "doc", "docx", "xlsx", "xls", "txt", "csv"}
+
+# (path, size, mtime) -> content hash, so regeneration does not rehash the file
+_hashes: OrderedDict[tuple, str] = OrderedDict()
+_hashes_lock = threading.Lock()
+_HASHES_MAX = 256
+
+
+def _ext(path: str) -> str:
+    return path.rsplit(".", 1)[-1].lower() if "." in path else ""
+
+
+def content_hash(path: str) -> str:
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _hashes_lock:
+        if key in _hashes:
+            _hashes.move_to_end(key)
+            return _hashes[key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    value = digest.hexdigest()
+
+    with _hashes_lock:
+        _hashes[key] = value
+        while len(_hashes) > _HASHES_MAX:
+            _hashes.popitem(last=False)
+    return value
+
+
+class _Collector:
+    """Collects text lines up to ATTACHMENT_MAX_CHARS."""
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.size = 0
+
+    @property
+    def full(self) -> bool:
+        return self.size >= Config.ATTACHMENT_MAX_CHARS
+
+    def add(self, line: str) -> None:
+        if self.full:
+            return
+        line = line[:Config.ATTACHMENT_MAX_CHARS - self.size]
+        self.parts.append(line)
+        self.size += len(line) + 1
+
+    def text(self) -> str:
+        return "\n".join(self.parts)
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _extract_xlsx(path: str) -> str:
+    from openpyxl import load_workbook
+
+    out = _Collector()
+    # read_only streams rows from the zip instead of loading the whole workbook
+    book = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in book.worksheets:
+            out.add(f"## {sheet.title}")
+            for row in sheet.iter_rows(values_only=True):
+                cells = [_cell(v) for v in row]
+                if any(cells):
+                    out.add("\t".join(cells).rstrip("\t"))
+                if out.full:
+                    return out.text()
+    finally:
+        book.close()
+    return out.text()
+
+
+def _extract_xls(path: str) -> str:
+    import xlrd
+
+    out = _Collector()
+    # on_demand loads one sheet at a time; each is unloaded when done
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        for name in book.sheet_names():
+            sheet = book.sheet_by_name(name)
+            out.add(f"## {name}")
+            for r in range(sheet.nrows):
+                cells = [_cell(v) for v in sheet.row_values(r)]
+                if any(cells):
+                    out.add("\t".join(cells).rstrip("\t"))
+                if out.full:
+                    return out.text()
+            book.unload_sheet(name)
+    finally:
+        book.release_resources()
+    return out.text()
+
+
+def extract_text(path: str) -> str | None:
+    """Extract text from an attachment file. Returns None for unsupported types."""
+    ext = _ext(path)
+
+    if ext == "pdf":
+        result = subprocess.run(
+            ["pdftotext", path, "-"],
+            capture_output=True, text=True, timeout=30,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"pdftotext failed: {result.stderr}")
+        return result.stdout[:Config.ATTACHMENT_MAX_CHARS]
+
+    if ext in ("doc", "docx"):
+        from docx import Document as DocxDocument
+        doc_file = DocxDocument(path)
+        out = _Collector()
+        for p in doc_file.paragraphs:
+            out.add(p.text)
+        return out.text()
+
+    if ext == "xlsx":
+        return _extract_xlsx(path)
+
+    if ext == "xls":
+        return _extract_xls(path)
+
+    if ext in ("txt", "csv"):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read(Config.ATTACHMENT_MAX_CHARS)
+
+    return None
+
+
+def extract_and_store(path: str, digest: str | None = None) -> dict:
+    """Extract path's text into attachment_texts unless it is already there.
+
+    A failed extraction is retried once it is ATTACHMENT_RETRY_FAILED_AFTER
+    seconds old, so a transient failure is not cached for good.
+    """
+    digest = digest or content_hash(path)
+    existing = attachment_text_model.find(digest, retry_failed_after=Config.ATTACHMENT_RETRY_FAILED_AFTER)
+    if existing:
+        return existing
+
+    try:
+        text = extract_text(path)
+        attachment_text_model.put(digest, text)
+        return {"content_hash": digest, "status": "done", "text": text}
+    except Exception as e:
+        logger.warning("Could not extract text from %s: %s", path, e)
+        attachment_text_model.put(digest, None, error=str(e))
+        return {"content_hash": digest, "status": "failed", "text": None}
+
+
+def get_text(path: str | None) -> str | None:
+    """Stored text for an attachment, extracting it now if the upload job has not run."""
+    if not path or not os.path.exists(path) or _ext(path) not in EXTRACTABLE:
+        return None
+    try:
+        return extract_and_store(path)["text"]
+    except Exception:
+        logger.warning("Could not read attachment text: %s", path)
+        return None
@@ -0,0 +1,114 @@
+"""Customer typeahead.
+
+Ranks name prefix matches first, then word prefix matches on name or
+contact person, then trigram similarity. With CUSTOMER_PREFIX_INDEX=1 the
+prefix tiers are answered from an in-process index of the picker fields, and
+only the trigram tier goes to Postgres. The index is rebuilt after writes in
+this process, and after writes from other processes once a cheap change
+check (every CUSTOMER_INDEX_CHECK_INTERVAL seconds) sees them.
+"""
+import re
+import time
+import logging
+import threading
+from bisect import bisect_left
+from config import Config
+from models import customer as customer_model
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _norm(text: str | None) -> str:
+    return (text or "").casefold().strip()
+
+
+class _PrefixIndex:
+    def __init__(self, rows: list[dict]):
+        self.rows = {r["id"]: r for r in rows}
+        self.sort_key = {r["id"]: _norm(r["name"]) for r in rows}
+        self.names = sorted((_norm(r["name"]), r["id"]) for r in rows)
+        self.words = sorted({
+            (word, r["id"])
+            for r in rows
+            for field in (r["name"], r["contact_person"])
+            for word in _WORD_RE.findall(_norm(field))
+        })
+
+    @staticmethod
+    def _scan(keys: list[tuple], prefix: str):
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            yield keys[i][1]
+            i += 1
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        prefix = _norm(query)
+        results, seen = [], set()
+
+        for customer_id in self._scan(self.names, prefix):
+            if len(results) >= limit:
+                return results
+            seen.add(customer_id)
+            results.append({**self.rows[customer_id], "tier": 0})
+
+        words = _WORD_RE.findall(prefix)
+        if not words:
+            return results
+        # Candidates share the first word; multi-word queries must match as a phrase
+        phrase = re.compile(r"\b" + re.escape(prefix))
+        word_ids = {
+            i for i in self._scan(self.words, words[0])
+            if i not in seen and any(
+                phrase.search(_norm(self.rows[i][field])) for field in ("name", "contact_person")
+            )
+        }
+        for customer_id in sorted(word_ids, key=self.sort_key.get)[:limit - len(results)]:
+            results.append({**self.rows[customer_id], "tier": 1})
+        return results
+
+
+_index: _PrefixIndex | None = None
+_index_marker: tuple | None = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def invalidate() -> None:
+    """Drop the in-process index after a customer write."""
+    global _index
+    with _lock:
+        _index = None
+
+
+def _get_index() -> _PrefixIndex:
+    global _index, _index_marker, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and now - _checked_at < Config.CUSTOMER_INDEX_CHECK_INTERVAL:
+            return _index
+
+        marker = customer_model.change_marker()
+        _checked_at = now
+        if _index is None or marker != _index_marker:
+            start = time.monotonic()
+            _index = _PrefixIndex(customer_model.list_for_picker())
+            _index_marker = marker
+            logger.info("Customer prefix index built with %d customers in %.0f ms",
+                        len(_index.rows), (time.monotonic() - start) * 1000)
+        return _index
+
+
+def search(query: str | None, limit: int = 20) -> list[dict]:
+    if not query or not Config.CUSTOMER_PREFIX_INDEX:
+        return customer_model.search(query=query, limit=limit)
+
+    results = _get_index().search(query, limit)
+    if len(results) < limit and len(query) >= 3:
+        # Trigram similarity is only useful from three characters
+        results += customer_model.search(
+            query=query, limit=limit - len(results),
+            exclude=[r["id"] for r in results], fuzzy_only=True,
+        )
+    return results
@@ -1,32 +1,47 @@
 import os
 import re
+import struct
 import logging
-import subprocess
 from datetime import datetime
-from docx import Document
-from docx.shared import Pt
+from io import BytesIO
+from docx.enum.text import WD_LINE_SPACING
+from docx.shared import Cm, Pt
 from config import Config
+from services import template_cache
 
 logger = logging.getLogger(__name__)
 
 TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
 OUTPUT_DIR = os.path.join(Config.UPLOAD_DIR, "generated")
 
+SIGNATURE_PATH = os.path.join(TEMPLATE_DIR, "signature.png")
+SIGNATURE_WIDTH = Cm(5)
+SIGNATURE_PADDING = 4  # points of slack around the image in its slot
+SIGNER_NAME = "Trond Ilbråten"
+
 
 def _ensure_output_dir():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
+TEMPLATE_MAP = {
+    "tilbud": "offer_template.docx",
+    "brev": "letter_template.docx",
+    "notat": "note_template.docx",
+    "omprofilering": "letter_template.docx",
+    "svar_paa_brev": "letter_template.docx",
+    "serviceavtale": "offer_template.docx",
+}
+
+
 def _get_template_path(doc_type: str) -> str:
-    template_map = {
-        "tilbud": "offer_template.docx",
-        "brev": "letter_template.docx",
-        "notat": "note_template.docx",
-        "omprofilering": "letter_template.docx",
-        "svar_paa_brev": "letter_template.docx",
-        "serviceavtale": "offer_template.docx",
-    }
-    return os.path.join(TEMPLATE_DIR, template_map.get(doc_type, "letter_template.docx"))
+    return os.path.join(TEMPLATE_DIR, TEMPLATE_MAP.get(doc_type, "letter_template.docx"))
+
+
+def warm_up() -> None:
+    """Parse all templates and load the signature so the first finalize is fast."""
+    paths = sorted({os.path.join(TEMPLATE_DIR, name) for name in TEMPLATE_MAP.values()})
+    template_cache.warm_up(paths, [SIGNATURE_PATH])
 
 
 def _safe_filename(name: str) -> str:
@@ -34,20 +49,41 @@ def _safe_filename(name: str) -> str:
 
 
 def generate_files(doc: dict) -> dict:
-    """Generate Word and PDF files from document data. Returns dict of file paths."""
+    """Generate Word and PDF files from document data. Returns dict of file paths.
+
+    The document is built once. The unsigned and signed variants differ only
+    by the signature image, which goes into a slot reserved in both so the
+    layout is identical. The signed PDF is made by stamping the signature onto
+    the unsigned PDF instead of running a second office conversion.
+    """
     _ensure_output_dir()
 
     base_name = _safe_filename(doc["document_name"])
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     file_base = f"{base_name}_{timestamp}"
 
-    # Generate unsigned Word
-    word_path = _generate_word(doc, file_base, signed=False)
-    word_signed_path = _generate_word(doc, file_base, signed=True)
+    document, signature_slot = _build_word(doc)
 
-    # Generate PDFs from Word files
+    # Unsigned Word + PDF
+    word_path = os.path.join(OUTPUT_DIR, f"{file_base}.docx")
+    document.save(word_path)
     pdf_path = _convert_to_pdf(word_path)
-    pdf_signed_path = _convert_to_pdf(word_signed_path)
+
+    # Signed Word: same document with the signature in its slot
+    word_signed_path = os.path.join(OUTPUT_DIR, f"{file_base}_signert.docx")
+    _insert_signature(signature_slot)
+    document.save(word_signed_path)
+
+    # Signed PDF: stamp the unsigned PDF, convert only if that fails
+    pdf_signed_path = None
+    if pdf_path:
+        pdf_signed_path = _stamp_signature(
+            pdf_path,
+            os.path.join(OUTPUT_DIR, f"{file_base}_signert.pdf"),
+            document.sections[-1].top_margin.pt,
+        )
+        if not pdf_signed_path:
+            pdf_signed_path = _convert_to_pdf(word_signed_path)
 
     return {
         "word": word_path,
@@ -57,22 +93,42 @@ def generate_files(doc: dict) -> dict:
     }
 
 
-def _replace_paragraph_placeholder(paragraph, key, value, bold=None):
-    """Replace placeholder in paragraph, handling split runs."""
-    full_text = paragraph.text
-    if key not in full_text:
-        return False
+# Placeholders that should NOT be bold (address fields etc.)
+NOT_BOLD = {
+    "{{recipientPerson}}", "{{recipientAddress}}",
+    "{{recipientPostalCode}}", "{{recipientCity}}",
+    "{{recipientPhone}}", "{{recipientEmail}}",
+}
 
-    new_text = full_text.replace(key, value)
-    # Clear all runs and set the replacement text on the first run
-    for i, run in enumerate(paragraph.runs):
-        if i == 0:
-            run.text = new_text
-            if bold is not None:
-                run.bold = bold
-        else:
-            run.text = ""
-    return True
+
+def _render_paragraph(paragraph, keys, replacements):
+    """Replace all known placeholders in paragraph with a single regex pass.
+
+    Placeholders may be split across runs, so the replaced text goes into the
+    first text run and the other text runs are emptied. Runs without text
+    (images, text boxes) are left alone.
+    """
+    if not keys & replacements.keys():
+        return
+
+    new_text = template_cache.PLACEHOLDER_RE.sub(
+        lambda m: replacements.get(m.group(0), m.group(0)), paragraph.text
+    )
+    text_runs = [run for run in paragraph.runs if run.text]
+    if not text_runs:
+        return
+    for i, run in enumerate(text_runs):
+        run.text = new_text if i == 0 else ""
+    if keys & NOT_BOLD:
+        text_runs[0].bold = False
+
+    if "{{documentTitle}}" in keys:
+        for run in paragraph.runs:
+            if run.text.strip():
+                run.bold = True
+                run.font.size = Pt(13)
+                run.font.name = "Arial"
+        paragraph.paragraph_format.space_after = Pt(14)
 
 
 def _add_markdown_paragraph(document, line, insert_before=None):
@@ -187,53 +243,17 @@ def _add_inline_runs(paragraph, text):
             paragraph.add_run(part)
 
 
-def _generate_word(doc: dict, file_base: str, signed: bool) -> str:
+def _build_word(doc: dict):
+    """Build the Word document. Returns (document, signature slot paragraph)."""
     template_path = _get_template_path(doc["document_type"])
-    document = Document(template_path)
-
-    # Force Arial on all text
-    document.styles["Normal"].font.name = "Arial"
+    document, placeholder_paras, placeholder_para = template_cache.get_template(template_path)
 
-    # Build replacements matching template placeholders
+    # Fill all indexed placeholder paragraphs in one pass
     replacements = _build_replacements(doc)
+    for paragraph, keys in placeholder_paras:
+        _render_paragraph(paragraph, keys, replacements)
 
-    # Placeholders that should NOT be bold (address fields etc.)
-    not_bold = {
-        "{{recipientPerson}}", "{{recipientAddress}}",
-        "{{recipientPostalCode}}", "{{recipientCity}}",
-        "{{recipientPhone}}", "{{recipientEmail}}",
-    }
-
-    # Replace simple placeholders (handles split runs)
-    for paragraph in document.paragraphs:
-        for key, value in replacements.items():
-            bold_override = False if key in not_bold else None
-            if _replace_paragraph_placeholder(paragraph, key, value, bold=bold_override):
-                if key == "{{documentTitle}}":
-                    for run in paragraph.runs:
-                        if run.text.strip():
-                            run.bold = True
-                            run.font.size = Pt(13)
-                            run.font.name = "Arial"
-                    paragraph.paragraph_format.space_after = Pt(14)
-
-    # Also replace in tables (some templates use tables for layout)
-    for table in document.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    for key, value in replacements.items():
-                        bold_override = False if key in not_bold else None
-                        _replace_paragraph_placeholder(paragraph, key, value, bold=bold_override)
-
-    # Find {{documentText}} placeholder paragraph
     text = doc.get("document_text", "")
-    placeholder_para = None
-
-    for paragraph in document.paragraphs:
-        if "{{documentText}}" in paragraph.text:
-            placeholder_para = paragraph
-            break
 
     # Insert document text at placeholder position (or append to end)
     if text:
@@ -243,29 +263,90 @@ def _generate_word(doc: dict, file_base: str, signed: bool) -> str:
 
     # Add closing signature block
     document.add_paragraph()
-    document.add_paragraph("Med vennlig hilsen")
-    document.add_paragraph()
-
-    # Add signature image for signed versions
-    if signed:
-        sig_path = os.path.join(TEMPLATE_DIR, "signature.png")
-        if os.path.exists(sig_path):
-            try:
-                from docx.shared import Cm
-                document.add_picture(sig_path, width=Cm(5))
-            except Exception:
-                logger.warning("Could not insert signature image")
+    closing = document.add_paragraph("Med vennlig hilsen")
+    closing.paragraph_format.keep_with_next = True
+    signature_slot = _reserve_signature_slot(document)
 
     p_name = document.add_paragraph()
-    run = p_name.add_run("Trond Ilbråten")
+    run = p_name.add_run(SIGNER_NAME)
     run.bold = True
     document.add_paragraph("Daglig leder")
     document.add_paragraph("Kulde- & Varmepumpeteknikk AS")
 
-    suffix = "_signert" if signed else ""
-    output_path = os.path.join(OUTPUT_DIR, f"{file_base}{suffix}.docx")
-    document.save(output_path)
-    return output_path
+    return document, signature_slot
+
+
+def _signature_size() -> tuple[float, float] | None:
+    """Signature width and height in points, or None if the image is missing."""
+    if not os.path.exists(SIGNATURE_PATH):
+        return None
+    header = template_cache.get_asset(SIGNATURE_PATH)[:24]
+    # PNG IHDR: width and height are big-endian uint32 at offset 16
+    width_px, height_px = struct.unpack(">II", header[16:24])
+    width_pt = SIGNATURE_WIDTH.pt
+    return width_pt, width_pt * height_px / width_px
+
+
+def _reserve_signature_slot(document):
+    """Add an empty paragraph tall enough for the signature image.
+
+    Both variants get the same slot, so inserting the image does not move
+    anything and the signed PDF can be stamped at the same position. The slot
+    is kept on the same page as the signer's name below it.
+    """
+    slot = document.add_paragraph()
+    slot.paragraph_format.keep_with_next = True
+    size = _signature_size()
+    if size:
+        slot.paragraph_format.line_spacing_rule = WD_LINE_SPACING.AT_LEAST
+        slot.paragraph_format.line_spacing = Pt(size[1] + SIGNATURE_PADDING)
+        slot.paragraph_format.space_after = Pt(0)
+    return slot
+
+
+def _insert_signature(slot) -> None:
+    if not os.path.exists(SIGNATURE_PATH):
+        return
+    try:
+        slot.add_run().add_picture(BytesIO(template_cache.get_asset(SIGNATURE_PATH)), width=SIGNATURE_WIDTH)
+    except Exception:
+        logger.warning("Could not insert signature image")
+
+
+def _stamp_signature(pdf_path: str, output_path: str, top_margin: float) -> str | None:
+    """Stamp the signature above the signer's name in the unsigned PDF.
+
+    Returns None if the signature would reach above the page's top margin,
+    so the caller converts the signed Word file instead.
+    """
+    size = _signature_size()
+    if not size:
+        return None
+    try:
+        import pymupdf
+    except ImportError:
+        logger.warning("pymupdf not installed - converting signed PDF separately")
+        return None
+
+    width, height = size
+    try:
+        with pymupdf.open(pdf_path) as pdf:
+            # The closing block is at the end, so search from the last page
+            for page in reversed(pdf):
+                hits = page.search_for(SIGNER_NAME)
+                if not hits:
+                    continue
+                name = hits[-1]
+                bottom = name.y0 - SIGNATURE_PADDING / 2
+                if bottom - height < top_margin:
+                    return None  # slot did not end up on this page
+                rect = pymupdf.Rect(name.x0, bottom - height, name.x0 + width, bottom)
+                page.insert_image(rect, stream=template_cache.get_asset(SIGNATURE_PATH), keep_proportion=True)
+                pdf.save(output_path, garbage=3, deflate=True)
+                return output_path
+    except Exception:
+        logger.exception("Could not stamp signature onto %s", pdf_path)
+    return None
 
 
 def _extract_title(document_name: str) -> str:
@@ -315,23 +396,6 @@ def _build_replacements(doc: dict) -> dict:
 
 
 def _convert_to_pdf(word_path: str) -> str | None:
-    """Convert Word file to PDF using LibreOffice headless."""
-    try:
-        result = subprocess.run(
-            [
-                "libreoffice", "--headless", "--convert-to", "pdf",
-                "--outdir", OUTPUT_DIR, word_path,
-            ],
-            capture_output=True, text=True, timeout=60,
-        )
-        if result.returncode == 0:
-            pdf_path = word_path.rsplit(".", 1)[0] + ".pdf"
-            if os.path.exists(pdf_path):
-                return pdf_path
-        logger.error("LibreOffice conversion failed: %s", result.stderr)
-    except subprocess.TimeoutExpired:
-        logger.error("LibreOffice conversion timed out for %s", word_path)
-    except FileNotFoundError:
-        logger.error("LibreOffice not installed - PDF generation unavailable")
-
-    return None
+    """Convert Word file to PDF using the LibreOffice converter pool."""
+    from services.office_pool import convert_to_pdf
+    return convert_to_pdf(word_path, OUTPUT_DIR)
@@ -1,22 +1,222 @@
+import time
+import random
+import hashlib
 import logging
-import openai
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from config import Config
+from db import own_transaction
 from models import knowledge as knowledge_model
+from models import embedding_cache as embedding_cache_model
+from services import llm_clients
 
 logger = logging.getLogger(__name__)
 
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIM = 1536
 
+# Tier 1: in-process LRU. Tier 2: embedding_cache table.
+_lru: OrderedDict[str, list[float]] = OrderedDict()
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "db_errors": 0}
+_puts_since_evict = 0
 
-def get_embedding(text: str) -> list[float]:
-    client = openai.OpenAI()
-    response = client.embeddings.create(
+# Query embeddings run here so hybrid search can give up on them
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="embedding")
+
+
+def _cache_key(text: str) -> str:
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _count(stat: str) -> None:
+    with _lock:
+        _stats[stat] += 1
+
+
+def _lru_get(key: str) -> list[float] | None:
+    with _lock:
+        embedding = _lru.get(key)
+        if embedding is not None:
+            _lru.move_to_end(key)
+        return embedding
+
+
+def _lru_put(key: str, embedding: list[float]) -> None:
+    with _lock:
+        _lru[key] = embedding
+        _lru.move_to_end(key)
+        while len(_lru) > Config.EMBEDDING_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+
+def _db_get(key: str) -> list[float] | None:
+    try:
+        with own_transaction():
+            return embedding_cache_model.get(key, Config.EMBEDDING_CACHE_TTL)
+    except Exception:
+        logger.warning("Embedding cache lookup failed")
+        _count("db_errors")
+        return None
+
+
+def _db_put(key: str, embedding: list[float]) -> None:
+    global _puts_since_evict
+    try:
+        with own_transaction():
+            embedding_cache_model.put(key, EMBEDDING_MODEL, embedding)
+            with _lock:
+                _puts_since_evict += 1
+                evict = _puts_since_evict >= Config.EMBEDDING_CACHE_EVICT_EVERY
+                if evict:
+                    _puts_since_evict = 0
+            if evict:
+                embedding_cache_model.evict(Config.EMBEDDING_CACHE_TTL, Config.EMBEDDING_CACHE_MAX_ROWS)
+    except Exception:
+        logger.warning("Embedding cache write failed")
+        _count("db_errors")
+
+
+def _fetch_embedding(text: str) -> list[float]:
+    response = llm_clients.openai_client().embeddings.create(
         model=EMBEDDING_MODEL,
         input=text,
+        timeout=30.0,
     )
     return response.data[0].embedding
 
 
-def search_similar(query: str, limit: int = 5) -> list[dict]:
-    embedding = get_embedding(query)
-    return knowledge_model.search_by_embedding(embedding, limit=limit)
+def get_embedding(text: str) -> list[float]:
+    key = _cache_key(text)
+
+    embedding = _lru_get(key)
+    if embedding is not None:
+        _count("memory_hits")
+        return embedding
+
+    embedding = _db_get(key)
+    if embedding is not None:
+        _count("db_hits")
+        _lru_put(key, embedding)
+        return embedding
+
+    _count("misses")
+    embedding = _fetch_embedding(text)
+    _lru_put(key, embedding)
+    _db_put(key, embedding)
+    return embedding
+
+
+def _estimate_tokens(text: str) -> int:
+    # Conservative for Norwegian text; the API limit is what matters here
+    return len(text) // 3 + 1
+
+
+def _batches(texts: list[str]):
+    """Split texts into index ranges bounded by input count and estimated tokens."""
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = _estimate_tokens(text)
+        if i > start and (
+            i - start >= Config.EMBEDDING_BATCH_MAX_INPUTS or tokens + cost > Config.EMBEDDING_BATCH_MAX_TOKENS
+        ):
+            yield start, i
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        yield start, len(texts)
+
+
+def _embed_batch(texts: list[str]) -> list[list[float]]:
+    """Embed one batch, retrying transient errors with exponential backoff."""
+    import openai
+    retryable = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+    client = llm_clients.openai_client().with_options(max_retries=0)
+
+    for attempt in range(Config.EMBEDDING_MAX_RETRIES + 1):
+        try:
+            response = client.embeddings.create(model=EMBEDDING_MODEL, input=texts, timeout=60.0)
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except retryable as e:
+            if attempt == Config.EMBEDDING_MAX_RETRIES:
+                raise
+            delay = min(2 ** attempt, 30) + random.uniform(0, 1)
+            logger.warning("Embedding batch failed (%s), retrying in %.1fs", e, delay)
+            time.sleep(delay)
+
+
+def iter_embedding_batches(texts: list[str]):
+    """Embed many texts in token-bounded batches.
+
+    Yields (start, end, embeddings, error) for each batch of texts[start:end].
+    embeddings is None and error is set when the batch failed after retries.
+    Bypasses the embedding cache, which is meant for repeated queries.
+    """
+    for start, end in _batches(texts):
+        try:
+            yield start, end, _embed_batch(texts[start:end]), None
+        except Exception as e:
+            logger.error("Embedding batch %d-%d failed: %s", start, end, e)
+            yield start, end, None, str(e)
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters for this process."""
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_size"] = len(_lru)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else None
+    return stats
+
+
+def _fuse(result_lists: list[list[dict]], limit: int) -> list[dict]:
+    """Reciprocal rank fusion of several ranked result lists."""
+    scores: dict[int, float] = {}
+    rows: dict[int, dict] = {}
+    for results in result_lists:
+        for rank, row in enumerate(results, start=1):
+            chunk_id = row["chunk_id"]
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (Config.RAG_RRF_K + rank)
+            merged = rows.setdefault(chunk_id, {"similarity": None})
+            merged.update(row)
+
+    fused = []
+    for chunk_id in sorted(scores, key=scores.get, reverse=True)[:limit]:
+        row = rows[chunk_id]
+        row["score"] = scores[chunk_id]
+        fused.append(row)
+    return fused
+
+
+def search_similar(query: str, limit: int = 5, mode: str | None = None) -> list[dict]:
+    """Search the knowledge base.
+
+    mode (default Config.RAG_MODE) is "vector", "lexical" or "hybrid". Hybrid
+    fuses vector and full-text ranks, and answers from the full-text index
+    alone if the query embedding is not ready within RAG_EMBEDDING_BUDGET_MS
+    or fails.
+    """
+    mode = mode or Config.RAG_MODE
+    if mode == "vector":
+        return knowledge_model.search_by_embedding(get_embedding(query), limit=limit)
+    if mode == "lexical":
+        return _fuse([knowledge_model.search_by_text(query, limit=limit)], limit)
+
+    candidates = limit * Config.RAG_CANDIDATE_MULTIPLIER
+    future = _executor.submit(get_embedding, query)
+    lexical = knowledge_model.search_by_text(query, limit=candidates)
+
+    try:
+        embedding = future.result(timeout=Config.RAG_EMBEDDING_BUDGET_MS / 1000)
+    except FutureTimeout:
+        logger.warning("Query embedding over budget, using lexical results only")
+        return _fuse([lexical], limit)
+    except Exception as e:
+        logger.warning("Query embedding failed (%s), using lexical results only", e)
+        return _fuse([lexical], limit)
+
+    vector = knowledge_model.search_by_embedding(embedding, limit=candidates)
+    return _fuse([vector, lexical], limit)
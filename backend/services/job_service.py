@@ -0,0 +1,139 @@
+import time
+import logging
+from config import Config
+from models import job as job_model
+from models import document as doc_model
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(job_type: str, payload: dict, user_id: int | None = None, document_id: int | None = None,
+            max_attempts: int = 1) -> dict:
+    if job_type not in _HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+    return job_model.create(job_type, payload, user_id=user_id, document_id=document_id, max_attempts=max_attempts)
+
+
+def job_types() -> list[str]:
+    return list(_HANDLERS)
+
+
+def run(job: dict) -> dict | None:
+    """Run the handler for a claimed job and return its result."""
+    handler, _ = _HANDLERS[job["job_type"]]
+    return handler(job)
+
+
+def on_failed(job: dict) -> None:
+    """Run cleanup for a job that has failed for good."""
+    _, cleanup = _HANDLERS[job["job_type"]]
+    if cleanup:
+        try:
+            cleanup(job)
+        except Exception:
+            logger.exception("Cleanup failed for job %s", job["id"])
+
+
+def save_generated_text(doc: dict, prompt: str, result: dict, user_id: int | None = None) -> dict:
+    """Store generated text on a document and release its generating lock.
+
+    The name comes from the subject the generation call returned; without
+    one, a name_document job names the document off the request path.
+    """
+    from services.ai_service import format_document_name
+
+    updates = {
+        "document_text": result["text"],
+        "ai_model": result["model"],
+        "status": "draft",
+    }
+    if result.get("subject"):
+        updates["document_name"] = format_document_name(doc, result["subject"])
+    if prompt:
+        updates["ai_prompt"] = prompt
+
+    updated = doc_model.update(doc["id"], **updates)
+    if not result.get("subject"):
+        try:
+            enqueue("name_document", {"expected_name": updated["document_name"]}, user_id=user_id, document_id=doc["id"])
+        except Exception:
+            logger.exception("Could not queue naming of document %s", doc["id"])
+    return updated
+
+
+# --- Handlers ---
+
+def _stream_with_progress(job: dict, doc: dict, prompt: str) -> dict:
+    """Stream the generation, writing the text so far to the job for the client to poll."""
+    from services.ai_service import stream_document_text
+
+    result, text, written_at = None, "", time.monotonic()
+    for event, payload in stream_document_text(doc, prompt):
+        if event == "delta":
+            text += payload
+        elif event == "reset":
+            text = ""
+        elif event == "done":
+            result = payload
+            break
+        if time.monotonic() - written_at >= Config.JOB_PROGRESS_INTERVAL:
+            job_model.set_progress(job["id"], text)
+            written_at = time.monotonic()
+    if result is None:
+        raise RuntimeError("Generering ble avbrutt")
+    return result
+
+
+def _generate_text(job: dict) -> dict:
+    from services.ai_service import generate_document_text
+
+    doc = doc_model.find_by_id(job["document_id"])
+    if not doc:
+        raise RuntimeError("Dokument ikke funnet")
+
+    prompt = job["payload"].get("prompt", "")
+    # Streaming shows progress; the plain call can be hedged across providers
+    if job["payload"].get("stream"):
+        result = _stream_with_progress(job, doc, prompt)
+    else:
+        result = generate_document_text(doc, prompt)
+    updated = save_generated_text(doc, prompt, result, user_id=job["user_id"])
+    return {
+        "document_id": doc["id"],
+        "document_name": updated["document_name"],
+        "model": result["model"],
+        "provider": result["provider"],
+        "route_reason": result["route_reason"],
+    }
+
+
+def _generate_text_failed(job: dict) -> None:
+    doc_model.set_status(job["document_id"], "draft", ["generating"])
+
+
+def _name_document(job: dict) -> dict:
+    from services.ai_service import generate_document_name
+
+    doc = doc_model.find_by_id(job["document_id"])
+    if not doc or not doc.get("document_text"):
+        return {"renamed": False}
+
+    name = generate_document_name(doc, doc["document_text"])
+    renamed = doc_model.rename(doc["id"], name, job["payload"]["expected_name"])
+    return {"renamed": renamed, "document_name": name}
+
+
+def _extract_attachment(job: dict) -> dict:
+    from services.attachment_service import extract_and_store
+
+    payload = job["payload"]
+    result = extract_and_store(payload["path"], payload["content_hash"])
+    return {"content_hash": result["content_hash"], "status": result["status"]}
+
+
+# job_type -> (handler, cleanup when the job has failed for good)
+_HANDLERS = {
+    "generate_text": (_generate_text, _generate_text_failed),
+    "name_document": (_name_document, None),
+    "extract_attachment": (_extract_attachment, None),
+}
@@ -3,7 +3,7 @@ import logging
 from werkzeug.utils import secure_filename
 from config import Config
 from models import knowledge as knowledge_model
-from services.embedding_service import get_embedding
+from services.embedding_service import iter_embedding_batches
 
 logger = logging.getLogger(__name__)
 
@@ -49,14 +49,21 @@ def process_knowledge_document(file, category: str, description: str, uploaded_b
     # Create DB record
     doc = knowledge_model.create_document(filename, category, description, uploaded_by)
 
-    # Chunk and embed
+    # Chunk and embed in batches, then store all rows in one transaction
     chunks = _chunk_text(text)
-    for i, chunk in enumerate(chunks):
-        try:
-            embedding = get_embedding(chunk)
-            knowledge_model.add_chunk(doc["id"], i, chunk, embedding, {"page_approx": i})
-        except Exception as e:
-            logger.error("Failed to embed chunk %d: %s", i, e)
-
-    doc["chunk_count"] = len(chunks)
+    rows = []
+    failed = []
+    for start, end, embeddings, error in iter_embedding_batches(chunks):
+        if error:
+            failed.append({"chunks": [start, end - 1], "error": error})
+            continue
+        for i, embedding in zip(range(start, end), embeddings):
+            rows.append((i, chunks[i], embedding, {"page_approx": i}))
+
+    if rows:
+        knowledge_model.add_chunks(doc["id"], rows)
+
+    doc["chunk_count"] = len(rows)
+    doc["failed_chunk_count"] = len(chunks) - len(rows)
+    doc["failed_batches"] = failed
     return doc
@@ -0,0 +1,76 @@
+"""Shared, connection-pooled clients for the LLM and embedding providers.
+
+One keep-alive client per provider per process, so calls reuse TLS
+connections instead of building a new HTTP pool each time. Clients are
+re-created after a fork (gunicorn workers, worker.py) so processes never
+share sockets.
+"""
+import os
+import threading
+import httpx
+from config import Config
+
+_clients: dict[str, object] = {}
+_clients_pid: int | None = None
+_lock = threading.Lock()
+
+# Clients inherited from a parent process. Kept referenced so they are never
+# garbage-collected here, which would close connections the parent still uses.
+_inherited: list[object] = []
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=Config.LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=Config.LLM_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(Config.LLM_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT)
+
+
+def _get(name: str, factory):
+    global _clients_pid
+    pid = os.getpid()
+    with _lock:
+        if _clients_pid != pid:
+            _inherited.extend(_clients.values())
+            _clients.clear()
+            _clients_pid = pid
+        client = _clients.get(name)
+        if client is None:
+            client = factory()
+            _clients[name] = client
+        return client
+
+
+def anthropic_client():
+    import anthropic
+    return _get("anthropic", lambda: anthropic.Anthropic(
+        http_client=anthropic.DefaultHttpxClient(limits=_limits(), timeout=_timeout()),
+        timeout=_timeout(),
+        max_retries=Config.LLM_MAX_RETRIES,
+    ))
+
+
+def openai_client():
+    import openai
+    return _get("openai", lambda: openai.OpenAI(
+        http_client=openai.DefaultHttpxClient(limits=_limits(), timeout=_timeout()),
+        timeout=_timeout(),
+        max_retries=Config.LLM_MAX_RETRIES,
+    ))
+
+
+def gemini_client():
+    from google import genai
+    from google.genai import types
+    return _get("gemini", lambda: genai.Client(
+        http_options=types.HttpOptions(
+            timeout=int(Config.LLM_TIMEOUT * 1000),
+            client_args={"limits": _limits()},
+            retry_options=types.HttpRetryOptions(attempts=Config.LLM_MAX_RETRIES + 1),
+        ),
+    ))
@@ -0,0 +1,288 @@
+"""Route generation calls across LLM providers.
+
+Each provider keeps an EWMA of its latency and error rate plus a window of
+recent latencies. Repeated failures open a circuit breaker that skips the
+provider until a cooldown has passed, after which a single probe request
+decides whether it closes again. Non-streaming calls are hedged: if the
+chosen provider has not answered by its p95 latency, the next provider is
+started as well and the first answer wins.
+
+Results carry the provider that answered and the reason it was used.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# API key environment variables; a provider without a key is never routed to
+_KEY_ENV = {
+    "claude": ("ANTHROPIC_API_KEY",),
+    "gpt": ("OPENAI_API_KEY",),
+    "gemini": ("GEMINI_API_KEY", "GOOGLE_API_KEY"),
+}
+
+
+class _Provider:
+    """Health statistics and circuit breaker for one provider."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.latency_ewma: float | None = None
+        self.error_rate = 0.0
+        self.latencies: deque[float] = deque(maxlen=200)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= Config.LLM_CIRCUIT_COOLDOWN and not self.probing:
+                return "half_open"
+            return "open"
+
+    def acquire(self, force: bool = False) -> bool:
+        """Whether a request may be sent now; claims the probe when half-open.
+
+        force admits the request as a probe even during the cooldown, for
+        when every provider's circuit is open.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if force or (time.monotonic() - self.opened_at >= Config.LLM_CIRCUIT_COOLDOWN and not self.probing):
+                self.probing = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back an unfinished probe (e.g. an abandoned stream)."""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self, seconds: float) -> None:
+        alpha = Config.LLM_EWMA_ALPHA
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(seconds)
+            self.latency_ewma = seconds if self.latency_ewma is None else alpha * seconds + (1 - alpha) * self.latency_ewma
+            self.error_rate = (1 - alpha) * self.error_rate
+            self.consecutive_failures = 0
+            if self.opened_at is not None:
+                logger.info("Circuit for %s closed", self.name)
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        alpha = Config.LLM_EWMA_ALPHA
+        with self.lock:
+            self.requests += 1
+            self.failures += 1
+            self.error_rate = alpha + (1 - alpha) * self.error_rate
+            self.consecutive_failures += 1
+            if self.probing or self.consecutive_failures >= Config.LLM_CIRCUIT_FAILURES:
+                if self.opened_at is None or self.probing:
+                    logger.warning("Circuit for %s opened after %d failures", self.name, self.consecutive_failures)
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def hedge_after(self) -> float:
+        """Seconds to wait before hedging: this provider's p95, once it has enough samples."""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < Config.LLM_HEDGE_MIN_SAMPLES:
+            return Config.LLM_HEDGE_DEFAULT
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return max(Config.LLM_HEDGE_MIN, p95)
+
+    def snapshot(self) -> dict:
+        state = self.state()
+        hedge_after = self.hedge_after()
+        with self.lock:
+            return {
+                "state": state,
+                "latency_ewma": self.latency_ewma,
+                "error_rate": self.error_rate,
+                "requests": self.requests,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "hedge_after": hedge_after,
+            }
+
+
+_providers = {name: _Provider(name) for name in _KEY_ENV}
+
+_executor: ThreadPoolExecutor | None = None
+_executor_pid: int | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-router")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _enabled(name: str) -> bool:
+    return name in _KEY_ENV and any(os.environ.get(key) for key in _KEY_ENV[name])
+
+
+def _ordered(available: set[str]) -> tuple[list[str], list[str], bool]:
+    """Providers in the order to try them, notes on any that were demoted, and
+    whether every circuit is open (so the breakers must be bypassed)."""
+    healthy, degraded, tripped, notes = [], [], [], []
+    for name in Config.LLM_PROVIDERS:
+        name = name.strip()
+        if name not in available or not _enabled(name):
+            continue
+        provider = _providers[name]
+        if provider.state() == "open":
+            tripped.append(name)
+            notes.append(f"{name} circuit open")
+        elif provider.error_rate > Config.LLM_MAX_ERROR_RATE:
+            degraded.append(name)
+            notes.append(f"{name} error rate {provider.error_rate:.0%}")
+        else:
+            healthy.append(name)
+
+    order = healthy + degraded
+    if not order and tripped:
+        # Every circuit is open; probing them is better than failing outright
+        notes.append("all circuits open")
+        return tripped, notes, True
+    return order, notes, False
+
+
+def _reason(base: str, notes: list[str]) -> str:
+    return "; ".join([base] + notes)
+
+
+def _timed(provider: _Provider, call) -> dict:
+    start = time.monotonic()
+    try:
+        result = call()
+    except Exception:
+        provider.record_failure()
+        raise
+    provider.record_success(time.monotonic() - start)
+    return result
+
+
+def generate(calls: dict) -> dict:
+    """Run calls[provider]() on the best provider, hedging and falling back as needed.
+
+    Returns the call's result with "provider" and "route_reason" added.
+    """
+    order, notes, force = _ordered(set(calls))
+    if not order:
+        raise RuntimeError("No LLM provider is configured")
+
+    executor = _get_executor()
+    pending: dict = {}
+    last_error: Exception | None = None
+    hedge_at: float | None = None
+
+    def launch(reason: str) -> bool:
+        nonlocal hedge_at
+        while order:
+            name = order.pop(0)
+            provider = _providers[name]
+            if not provider.acquire(force):
+                continue
+            pending[executor.submit(_timed, provider, calls[name])] = (name, reason)
+            hedge_at = time.monotonic() + provider.hedge_after() if Config.LLM_HEDGE else None
+            return True
+        return False
+
+    launch(_reason("preferred", notes))
+    while pending:
+        timeout = None
+        if hedge_at is not None and order:
+            timeout = max(0.0, hedge_at - time.monotonic())
+
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            slow = ", ".join(name for name, _ in pending.values())
+            logger.info("Hedging: %s slower than p95", slow)
+            if not launch(_reason(f"hedged, {slow} slower than p95", notes)):
+                hedge_at = None
+            continue
+
+        for future in done:
+            name, reason = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning("%s failed: %s", name, e)
+                last_error = e
+                if not pending:
+                    launch(_reason(f"fallback, {name} failed", notes))
+                continue
+            # Slower requests still running finish in the background and update stats
+            logger.info("Generated with %s (%s)", name, reason)
+            return {**result, "provider": name, "route_reason": reason}
+
+    raise RuntimeError("Kunne ikke generere tekst. Prøv igjen senere.") from last_error
+
+
+def stream(calls: dict):
+    """Stream from the best provider, falling back in order on failure.
+
+    calls maps provider -> generator factory yielding ("delta", text) and
+    ("done", result). Yields ("reset", None) before each fallback, and adds
+    "provider" and "route_reason" to the final result. Streams are not hedged.
+    """
+    order, notes, force = _ordered(set(calls))
+    if not order:
+        raise RuntimeError("No LLM provider is configured")
+
+    reason = _reason("preferred", notes)
+    last_error: Exception | None = None
+    attempted = False
+    for name in order:
+        provider = _providers[name]
+        if not provider.acquire(force):
+            continue
+        if attempted:
+            yield "reset", None
+
+        attempted = True
+        start = time.monotonic()
+        finished = False
+        try:
+            for event, payload in calls[name]():
+                if event == "done":
+                    provider.record_success(time.monotonic() - start)
+                    finished = True
+                    logger.info("Streamed with %s (%s)", name, reason)
+                    payload = {**payload, "provider": name, "route_reason": reason}
+                yield event, payload
+            return
+        except Exception as e:
+            if not finished:
+                provider.record_failure()
+                finished = True
+            logger.warning("%s stream failed: %s", name, e)
+            last_error = e
+            reason = _reason(f"fallback, {name} failed", notes)
+        finally:
+            if not finished:
+                provider.release()  # client went away mid-stream
+
+    raise RuntimeError("Kunne ikke generere tekst. Prøv igjen senere.") from last_error
+
+
+def stats() -> dict:
+    return {name: provider.snapshot() for name, provider in _providers.items() if _enabled(name)}
@@ -0,0 +1,281 @@
+"""Pool of long-lived LibreOffice converters for Word -> PDF.
+
+Each pool member is an `unoserver` process with its own LibreOffice profile,
+so conversions reuse a warm office instance and never fight over the shared
+profile lock. Conversions are sent with `unoconvert`. If unoserver is not
+installed or the pool is disabled, a cold `libreoffice --headless` run with a
+throwaway profile is used instead.
+
+The pool belongs to one process: it is started lazily in each worker
+(warm_up on the first request, or the first conversion), reset in a forked
+child, and every converter runs under office_watchdog so it dies with the
+worker even when the worker is SIGKILLed.
+"""
+import os
+import sys
+import time
+import queue
+import shutil
+import signal
+import socket
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_WATCHDOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "office_watchdog.py")
+
+
+class OfficePoolBusy(RuntimeError):
+    """Raised when the conversion queue is full."""
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _port_open(port: int) -> bool:
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+class _Office:
+    """One unoserver process with a private profile directory."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.lock = threading.Lock()
+        self.proc: subprocess.Popen | None = None
+        self.port = 0
+        self.profile_dir: str | None = None
+
+    def start(self) -> None:
+        self.port = _free_port()
+        uno_port = _free_port()
+        self.profile_dir = tempfile.mkdtemp(prefix=f"tekstflyt-office-{self.index}-")
+        self.proc = subprocess.Popen(
+            [
+                sys.executable, _WATCHDOG, str(os.getpid()),
+                "unoserver",
+                "--interface", "127.0.0.1",
+                "--port", str(self.port),
+                "--uno-port", str(uno_port),
+                "--user-installation", Path(self.profile_dir).as_uri(),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+        deadline = time.monotonic() + Config.OFFICE_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                break
+            if _port_open(self.port):
+                logger.info("Office converter %d ready on port %d", self.index, self.port)
+                return
+            time.sleep(0.25)
+
+        self.stop()
+        raise RuntimeError(f"Office converter {self.index} did not start")
+
+    def stop(self) -> None:
+        if self.proc and self.proc.poll() is None:
+            # Kill the whole session (watchdog, unoserver, soffice)
+            try:
+                os.killpg(self.proc.pid, signal.SIGTERM)
+                self.proc.wait(timeout=10)
+            except (ProcessLookupError, subprocess.TimeoutExpired):
+                try:
+                    os.killpg(self.proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        self.proc = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def restart(self) -> None:
+        logger.warning("Restarting office converter %d", self.index)
+        self.stop()
+        self.start()
+
+    def healthy(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None and _port_open(self.port)
+
+    def convert(self, word_path: str, pdf_path: str) -> bool:
+        result = subprocess.run(
+            [
+                "unoconvert",
+                "--host", "127.0.0.1",
+                "--port", str(self.port),
+                "--convert-to", "pdf",
+                word_path, pdf_path,
+            ],
+            capture_output=True, text=True, timeout=Config.OFFICE_CONVERT_TIMEOUT,
+        )
+        if result.returncode != 0:
+            logger.error("unoconvert failed: %s", result.stderr)
+        return result.returncode == 0 and os.path.exists(pdf_path)
+
+
+class OfficePool:
+    def __init__(self, size: int, queue_size: int):
+        self._offices = [_Office(i) for i in range(size)]
+        self._idle: queue.Queue[_Office] = queue.Queue()
+        # Bounds converting + waiting requests
+        self._slots = threading.BoundedSemaphore(size + queue_size)
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        for office in self._offices:
+            try:
+                office.start()
+            except Exception:
+                logger.exception("Could not start office converter %d", office.index)
+            self._idle.put(office)
+        threading.Thread(target=self._monitor, name="office-pool-monitor", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        for office in self._offices:
+            office.stop()
+
+    def convert(self, word_path: str, pdf_path: str) -> bool:
+        if not self._slots.acquire(blocking=False):
+            raise OfficePoolBusy("PDF conversion queue is full")
+        try:
+            office = self._idle.get(timeout=Config.OFFICE_QUEUE_TIMEOUT)
+            try:
+                with office.lock:
+                    try:
+                        if not office.healthy():
+                            office.restart()
+                        return office.convert(word_path, pdf_path)
+                    except subprocess.TimeoutExpired:
+                        logger.error("Office converter %d hung on %s", office.index, word_path)
+                        office.stop()  # restarted by the monitor or the next checkout
+                        return False
+                    except RuntimeError:
+                        logger.exception("Office converter %d unavailable", office.index)
+                        return False
+            finally:
+                self._idle.put(office)
+        except queue.Empty:
+            logger.error("Timed out waiting for an office converter")
+            return False
+        finally:
+            self._slots.release()
+
+    def _monitor(self) -> None:
+        """Restart idle converters that have died."""
+        while not self._stopped.wait(Config.OFFICE_HEALTH_INTERVAL):
+            for office in self._offices:
+                if not office.lock.acquire(blocking=False):
+                    continue  # busy converting
+                try:
+                    if not office.healthy():
+                        office.restart()
+                except Exception:
+                    logger.exception("Health check failed for office converter %d", office.index)
+                finally:
+                    office.lock.release()
+
+
+_pool: OfficePool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+_warmed_pid: int | None = None
+
+
+def _after_fork() -> None:
+    """Start over in a forked child: the parent's pool (and a lock a warm-up
+    thread may have held at fork time) must not be used here."""
+    global _pool, _pool_pid, _pool_lock, _warmed_pid
+    _pool_lock = threading.Lock()
+    _pool = None
+    _pool_pid = None
+    _warmed_pid = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _get_pool() -> OfficePool | None:
+    """Return this process's pool, starting it on first use (or after a fork)."""
+    global _pool, _pool_pid
+    if Config.OFFICE_POOL_SIZE <= 0 or not shutil.which("unoserver"):
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = OfficePool(Config.OFFICE_POOL_SIZE, Config.OFFICE_QUEUE_SIZE)
+            _pool_pid = os.getpid()
+            _pool.start()
+        return _pool
+
+
+def warm_up() -> None:
+    """Start this process's converter pool in the background, once.
+
+    Call it from the serving process (not a preloading master), e.g. on each
+    request; after the first call per process it returns immediately.
+    """
+    global _warmed_pid
+    if _warmed_pid == os.getpid():
+        return
+    _warmed_pid = os.getpid()
+    threading.Thread(target=_get_pool, name="office-pool-warmup", daemon=True).start()
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool and _pool_pid == os.getpid():
+            _pool.stop()
+        _pool = None
+
+
+def convert_to_pdf(word_path: str, output_dir: str) -> str | None:
+    """Convert a Word file to PDF in output_dir. Returns the PDF path or None."""
+    pdf_path = os.path.join(output_dir, os.path.basename(word_path).rsplit(".", 1)[0] + ".pdf")
+
+    pool = _get_pool()
+    if pool:
+        return pdf_path if pool.convert(word_path, pdf_path) else None
+
+    return _convert_cold(word_path, output_dir, pdf_path)
+
+
+def _convert_cold(word_path: str, output_dir: str, pdf_path: str) -> str | None:
+    """One-off LibreOffice run with a throwaway profile."""
+    profile_dir = tempfile.mkdtemp(prefix="tekstflyt-office-")
+    try:
+        result = subprocess.run(
+            [
+                "libreoffice", "--headless",
+                f"-env:UserInstallation={Path(profile_dir).as_uri()}",
+                "--convert-to", "pdf",
+                "--outdir", output_dir, word_path,
+            ],
+            capture_output=True, text=True, timeout=Config.OFFICE_CONVERT_TIMEOUT,
+        )
+        if result.returncode == 0 and os.path.exists(pdf_path):
+            return pdf_path
+        logger.error("LibreOffice conversion failed: %s", result.stderr)
+    except subprocess.TimeoutExpired:
+        logger.error("LibreOffice conversion timed out for %s", word_path)
+    except FileNotFoundError:
+        logger.error("LibreOffice not installed - PDF generation unavailable")
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+    return None
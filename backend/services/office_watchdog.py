@@ -0,0 +1,40 @@
+"""Run a command and kill its process group when the parent process dies.
+
+Started by office_pool in a new session, so the watchdog, unoserver and its
+soffice share one process group. If the gunicorn worker that owns them is
+killed (e.g. SIGKILL on a worker timeout) the watchdog sees its parent
+change and takes the whole group down, so no office process is orphaned.
+Stdlib only; it runs as a plain script.
+
+Usage: python office_watchdog.py <parent pid> <command> [args...]
+"""
+import os
+import sys
+import time
+import signal
+import subprocess
+
+POLL_SECONDS = 1.0
+GRACE_SECONDS = 10.0
+
+
+def main() -> int:
+    parent = int(sys.argv[1])
+    # Outlive our own killpg(SIGTERM) long enough to follow up with SIGKILL.
+    # A handler (unlike SIG_IGN) is reset in the exec'd child.
+    signal.signal(signal.SIGTERM, lambda signum, frame: None)
+    child = subprocess.Popen(sys.argv[2:])
+
+    while child.poll() is None:
+        if os.getppid() != parent:
+            os.killpg(0, signal.SIGTERM)
+            deadline = time.monotonic() + GRACE_SECONDS
+            while child.poll() is None and time.monotonic() < deadline:
+                time.sleep(0.2)
+            os.killpg(0, signal.SIGKILL)  # soffice may outlive unoserver; this ends us too
+        time.sleep(POLL_SECONDS)
+    return child.returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Registry of prompt files and composed system prompts.
+
+All files in prompts/ are read once and the system prompt for each document
+type (base_system + type file) is composed ahead of time, with a stable
+content hash that can be used as a cache key. Files are re-checked for mtime
+changes at most every PROMPT_RELOAD_INTERVAL seconds, and reload() forces it.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+BASE_PROMPT = "base_system"
+
+_lock = threading.Lock()
+_mtimes: dict[str, float] = {}
+_system_prompts: dict[str, tuple[str, str]] = {}  # document_type -> (prompt, sha256)
+_checked_at = 0.0
+
+
+def _scan() -> dict[str, float]:
+    return {
+        entry.name[:-4]: entry.stat().st_mtime
+        for entry in os.scandir(PROMPT_DIR)
+        if entry.is_file() and entry.name.endswith(".txt")
+    }
+
+
+def _load(mtimes: dict[str, float]) -> None:
+    global _mtimes, _system_prompts
+    prompts = {}
+    for name in mtimes:
+        with open(os.path.join(PROMPT_DIR, f"{name}.txt"), "r", encoding="utf-8") as f:
+            prompts[name] = f.read()
+
+    base = prompts.get(BASE_PROMPT, "")
+    system_prompts = {}
+    for name, type_prompt in prompts.items():
+        if name == BASE_PROMPT:
+            continue
+        composed = f"{base}\n\n{type_prompt}"
+        system_prompts[name] = (composed, hashlib.sha256(composed.encode("utf-8")).hexdigest())
+
+    _system_prompts = system_prompts
+    _mtimes = mtimes
+    logger.info("Loaded %d system prompts", len(system_prompts))
+
+
+def _ensure_fresh() -> None:
+    global _checked_at
+    now = time.monotonic()
+    if _system_prompts and now - _checked_at < Config.PROMPT_RELOAD_INTERVAL:
+        return
+    with _lock:
+        if _system_prompts and now - _checked_at < Config.PROMPT_RELOAD_INTERVAL:
+            return
+        mtimes = _scan()
+        if mtimes != _mtimes:
+            _load(mtimes)
+        _checked_at = now
+
+
+def reload() -> dict[str, str]:
+    """Reload all prompt files now. Returns the hash of each system prompt."""
+    global _checked_at
+    with _lock:
+        _load(_scan())
+        _checked_at = time.monotonic()
+    return prompt_hashes()
+
+
+def get_system_prompt(document_type: str) -> str:
+    _ensure_fresh()
+    return _system_prompts[document_type][0]
+
+
+def get_prompt_hash(document_type: str) -> str:
+    _ensure_fresh()
+    return _system_prompts[document_type][1]
+
+
+def prompt_hashes() -> dict[str, str]:
+    _ensure_fresh()
+    return {doc_type: entry[1] for doc_type, entry in sorted(_system_prompts.items())}
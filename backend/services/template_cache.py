@@ -0,0 +1,140 @@
+"""Process-level cache of parsed DOCX templates and binary assets.
+
+Templates are parsed and compiled once and handed out as deep copies, which
+is much cheaper than unzipping and parsing the package on every render.
+Entries are reloaded when the file's mtime changes.
+
+Compiling a template records the path (child indices from the part's root)
+of every paragraph that contains a {{placeholder}}, in the body, tables,
+headers, footers and text boxes, so a render follows those paths into its
+copy instead of walking the whole tree.
+"""
+import os
+import re
+import copy
+import threading
+from docx import Document
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+
+PLACEHOLDER_RE = re.compile(r"\{\{\w+\}\}")
+
+# Placeholder whose paragraph is replaced by the document body
+BODY_PLACEHOLDER = "{{documentText}}"
+
+_STORY_CONTENT_TYPES = {CT.WML_DOCUMENT_MAIN, CT.WML_HEADER, CT.WML_FOOTER}
+
+_documents: dict[str, tuple[float, tuple[Document, dict]]] = {}
+_assets: dict[str, tuple[float, bytes]] = {}
+_lock = threading.Lock()
+
+
+def _story_parts(document: Document) -> dict:
+    """Main document, header and footer parts keyed by part name."""
+    return {
+        str(part.partname): part
+        for part in document.part.package.iter_parts()
+        if part.content_type in _STORY_CONTENT_TYPES
+    }
+
+
+def _path(root, element) -> tuple[int, ...]:
+    """Child indices leading from root down to element."""
+    path = []
+    while element is not root:
+        parent = element.getparent()
+        path.append(parent.index(element))
+        element = parent
+    return tuple(reversed(path))
+
+
+def _follow(root, path: tuple[int, ...]):
+    element = root
+    for i in path:
+        element = element[i]
+    return element
+
+
+def _compile(document: Document) -> dict:
+    """Index the placeholders in a template.
+
+    Returns {"paragraphs": [(partname, path, keys)], "body_index": int | None}
+    where path leads from the part's root element to the paragraph, and
+    body_index is the position of the {{documentText}} paragraph among the
+    body's children.
+    """
+    paragraphs = []
+    for partname, part in _story_parts(document).items():
+        root = part.element
+        for p in root.iter(qn("w:p")):
+            keys = frozenset(PLACEHOLDER_RE.findall(Paragraph(p, None).text))
+            if keys:
+                paragraphs.append((partname, _path(root, p), keys))
+
+    body_index = None
+    for i, child in enumerate(document.element.body):
+        if child.tag == qn("w:p") and BODY_PLACEHOLDER in Paragraph(child, None).text:
+            body_index = i
+            break
+
+    return {"paragraphs": paragraphs, "body_index": body_index}
+
+
+def _load_template(path: str) -> tuple[Document, dict]:
+    document = Document(path)
+    # Force Arial on all text
+    document.styles["Normal"].font.name = "Arial"
+    return document, _compile(document)
+
+
+def _cached(store: dict, path: str, load):
+    mtime = os.path.getmtime(path)
+    entry = store.get(path)
+    if entry and entry[0] == mtime:
+        return entry[1]
+    with _lock:
+        entry = store.get(path)
+        if not entry or entry[0] != mtime:
+            entry = (mtime, load(path))
+            store[path] = entry
+        return entry[1]
+
+
+def get_template(path: str) -> tuple[Document, list[tuple[Paragraph, frozenset]], Paragraph | None]:
+    """Return a private copy of the template at path, safe to modify.
+
+    Also returns the copy's placeholder paragraphs with their keys, and the
+    {{documentText}} paragraph if the template has one.
+    """
+    template, plan = _cached(_documents, path, _load_template)
+    document = copy.deepcopy(template)
+
+    parts = _story_parts(document)
+    paragraphs = [
+        (Paragraph(_follow(parts[partname].element, path), None), keys)
+        for partname, path, keys in plan["paragraphs"]
+    ]
+
+    body_para = None
+    if plan["body_index"] is not None:
+        body_para = Paragraph(document.element.body[plan["body_index"]], document._body)
+
+    return document, paragraphs, body_para
+
+
+def get_asset(path: str) -> bytes:
+    """Return the contents of a binary asset such as the signature image."""
+    def _read(p):
+        with open(p, "rb") as f:
+            return f.read()
+    return _cached(_assets, path, _read)
+
+
+def warm_up(document_paths: list[str], asset_paths: list[str]) -> None:
+    for path in document_paths:
+        if os.path.exists(path):
+            _cached(_documents, path, _load_template)
+    for path in asset_paths:
+        if os.path.exists(path):
+            get_asset(path)
@@ -0,0 +1,59 @@
+import pytest
+from config import Config
+from services import llm_router
+
+
+@pytest.fixture
+def claude_only(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.setattr(Config, "LLM_PROVIDERS", ["claude"])
+    monkeypatch.setattr(Config, "LLM_CIRCUIT_FAILURES", 2)
+    monkeypatch.setattr(Config, "LLM_CIRCUIT_COOLDOWN", 3600.0)
+    monkeypatch.setattr(Config, "LLM_HEDGE", False)
+    monkeypatch.setattr(llm_router, "_providers", {name: llm_router._Provider(name) for name in llm_router._KEY_ENV})
+
+
+def _fail():
+    raise ConnectionError("down")
+
+
+def _trip(calls):
+    for _ in range(Config.LLM_CIRCUIT_FAILURES):
+        with pytest.raises(RuntimeError):
+            llm_router.generate(calls)
+    assert llm_router._providers["claude"].state() == "open"
+
+
+def test_generate_probes_when_all_circuits_open(claude_only):
+    _trip({"claude": _fail})
+
+    result = llm_router.generate({"claude": lambda: {"text": "ok"}})
+
+    assert result["text"] == "ok"
+    assert "all circuits open" in result["route_reason"]
+    assert llm_router._providers["claude"].state() == "closed"
+
+
+def test_stream_probes_when_all_circuits_open(claude_only):
+    _trip({"claude": _fail})
+
+    def events():
+        yield "delta", "ok"
+        yield "done", {"text": "ok"}
+
+    out = list(llm_router.stream({"claude": events}))
+
+    assert out[-1][1]["provider"] == "claude"
+    assert llm_router._providers["claude"].state() == "closed"
+
+
+def test_failed_probe_keeps_circuit_open(claude_only):
+    _trip({"claude": _fail})
+
+    with pytest.raises(RuntimeError):
+        llm_router.generate({"claude": _fail})
+
+    assert llm_router._providers["claude"].state() == "open"
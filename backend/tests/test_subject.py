@@ -0,0 +1,38 @@
+import random
+import pytest
+from services.ai_service import _SubjectFilter, _clean_subject, _split_subject
+
+
+def _stream(text: str, seed: int) -> tuple[str, str | None]:
+    rng = random.Random(seed)
+    subject_filter, out, i = _SubjectFilter(), [], 0
+    while i < len(text):
+        n = rng.randint(1, 7)
+        out.append(subject_filter.feed(text[i:i + n]))
+        i += n
+    rest, subject = subject_filter.finish()
+    return "".join(out) + rest, subject
+
+
+@pytest.mark.parametrize("text, body, subject", [
+    ("Hei\n\nTekst.\n\nEMNE: Varmepumpe", "Hei\n\nTekst.\n", "Varmepumpe"),
+    ("Emne: Tilbud på varmepumpe\n\nHei\n\nEMNE: Varmepumpe\n", "Emne: Tilbud på varmepumpe\n\nHei\n", "Varmepumpe"),
+    ("Hei\nEmne: Service på anlegget\nMvh Ola", "Hei\nEmne: Service på anlegget\nMvh Ola", None),
+    ("Tekst.\n\n**EMNE:** Luft til vann", "Tekst.\n", "Luft til vann"),
+    ("Tekst.\n**Emne**: Luft til vann", "Tekst.\n", "Luft til vann"),
+    ("Tekst.\n_EMNE:_ Luft til vann\n", "Tekst.\n", "Luft til vann"),
+    ("Tekst.\nEMNE:\nVarmepumpe", "Tekst.\n", "Varmepumpe"),
+    ("Tekst.\nEMNE: «Luft til vann».", "Tekst.\n", "Luft til vann"),
+    ("Tekst uten emne.", "Tekst uten emne.", None),
+    ("EMNE:\nDette er\nbrødtekst", "EMNE:\nDette er\nbrødtekst", None),
+])
+def test_split_subject(text, body, subject):
+    assert _split_subject(text) == (body, subject)
+    for seed in range(20):
+        assert _stream(text, seed) == (body, subject)
+
+
+def test_clean_subject_strips_period_before_quotes():
+    assert _clean_subject(" «Luft til vann». ") == "Luft til vann"
+    assert _clean_subject('"Varmepumpe."') == "Varmepumpe"
+    assert _clean_subject("**") is None
@@ -0,0 +1,99 @@
+"""Background job worker for TekstFlyt v2.
+
+Runs document generation and other slow jobs outside the gunicorn workers.
+Jobs are claimed from the jobs table with FOR UPDATE SKIP LOCKED, so several
+worker processes can run side by side.
+
+Usage:
+    python worker.py                # LLM_WORKERS threads
+    python worker.py --workers 4    # Override pool size
+"""
+import sys
+import signal
+import logging
+import threading
+from config import Config
+from db import init_db, close_db
+from models import job as job_model
+from models import idempotency as idempotency_model
+from models import generation_cache as generation_cache_model
+from services import job_service
+
+logger = logging.getLogger("worker")
+
+_stop = threading.Event()
+
+
+def _work_loop(name: str) -> None:
+    types = job_service.job_types()
+    while not _stop.is_set():
+        try:
+            job = job_model.claim_next(types, Config.JOB_STALE_SECONDS)
+        except Exception:
+            logger.exception("[%s] Could not claim job", name)
+            _stop.wait(Config.JOB_POLL_INTERVAL)
+            continue
+
+        if not job:
+            _stop.wait(Config.JOB_POLL_INTERVAL)
+            continue
+
+        logger.info("[%s] Running job %s (%s)", name, job["id"], job["job_type"])
+        try:
+            result = job_service.run(job)
+            job_model.complete(job["id"], result)
+            logger.info("[%s] Job %s done", name, job["id"])
+        except Exception as e:
+            logger.exception("[%s] Job %s failed", name, job["id"])
+            failed = job_model.fail(job["id"], str(e))
+            if failed and failed["status"] == "failed":
+                job_service.on_failed(failed)
+
+
+def _reap_stale() -> None:
+    """Fail jobs whose worker died mid-run, so their documents are unlocked,
+    and purge expired idempotency keys and cached generations."""
+    while not _stop.is_set():
+        try:
+            for job in job_model.fail_stale(Config.JOB_STALE_SECONDS):
+                logger.warning("Job %s abandoned by dead worker, marked failed", job["id"])
+                job_service.on_failed(job)
+            idempotency_model.purge_expired()
+            if Config.GENERATION_CACHE:
+                generation_cache_model.purge_expired(Config.GENERATION_CACHE_TTL)
+        except Exception:
+            logger.exception("Stale job reaper failed")
+        _stop.wait(60)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    workers = Config.LLM_WORKERS
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+
+    init_db(maxconn=max(Config.DB_POOL_MAX, workers + 1))
+
+    def _shutdown(signum, frame):
+        logger.info("Shutting down, waiting for running jobs...")
+        _stop.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    threads = [threading.Thread(target=_reap_stale, name="reaper", daemon=True)]
+    for i in range(workers):
+        threads.append(threading.Thread(target=_work_loop, args=(f"llm-{i}",), name=f"llm-{i}"))
+    for t in threads:
+        t.start()
+
+    logger.info("Worker started with %d LLM worker(s)", workers)
+    for t in threads[1:]:
+        t.join()
+
+    close_db()
+
+
+if __name__ == "__main__":
+    main()
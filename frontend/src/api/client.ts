@@ -21,31 +21,56 @@ export class ApiError extends Error {
   }
 }
 
+// Mutating requests still in flight, by method + path + body. A repeat (a
+// double click) shares the first request's promise instead of sending again.
+const _inFlight = new Map<string, Promise<unknown>>()
+
+async function send(path: string, options: RequestInit, headers: Record<string, string>): Promise<Response> {
+  const init: RequestInit = { ...options, credentials: 'include', headers }
+  try {
+    return await fetch(`${API_BASE}${path}`, init)
+  } catch (err) {
+    // Network error: the server may have handled the request, so retry once
+    // with the same Idempotency-Key and let it replay the stored response
+    if (!headers['Idempotency-Key']) throw err
+    return fetch(`${API_BASE}${path}`, init)
+  }
+}
+
 export async function fetchApi<T>(
   path: string,
   options: RequestInit = {},
 ): Promise<T> {
-  const csrfHeaders: Record<string, string> = {}
   const method = options.method?.toUpperCase()
-  if (method && method !== 'GET' && method !== 'HEAD') {
-    if (_csrfToken) csrfHeaders['X-CSRF-Token'] = _csrfToken
+  const mutating = !!method && method !== 'GET' && method !== 'HEAD'
+  const headers: Record<string, string> = {
+    'Content-Type': 'application/json',
+    ...(options.headers as Record<string, string> | undefined),
   }
+  if (mutating) {
+    if (_csrfToken) headers['X-CSRF-Token'] = _csrfToken
+    headers['Idempotency-Key'] ??= crypto.randomUUID()
+  }
+
+  const run = async (): Promise<T> => {
+    const res = await send(path, options, headers)
 
-  const res = await fetch(`${API_BASE}${path}`, {
-    credentials: 'include',
-    headers: {
-      'Content-Type': 'application/json',
-      ...csrfHeaders,
-      ...options.headers,
-    },
-    ...options,
-  })
-
-  if (!res.ok) {
-    const body = await res.json().catch(() => ({ error: res.statusText }))
-    throw new ApiError(res.status, body.error || res.statusText)
+    if (!res.ok) {
+      const body = await res.json().catch(() => ({ error: res.statusText }))
+      throw new ApiError(res.status, body.error || res.statusText)
+    }
+
+    if (res.status === 204) return undefined as T
+    return res.json()
   }
 
-  if (res.status === 204) return undefined as T
-  return res.json()
+  // Only JSON bodies can be compared
+  if (!mutating || (options.body != null && typeof options.body !== 'string')) return run()
+
+  const key = `${method} ${path} ${options.body ?? ''}`
+  const pending = _inFlight.get(key)
+  if (pending) return pending as Promise<T>
+  const promise = run().finally(() => _inFlight.delete(key))
+  _inFlight.set(key, promise)
+  return promise
 }
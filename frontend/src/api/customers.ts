@@ -14,12 +14,15 @@ export interface Customer {
   updated_at: string
 }
 
-export async function searchCustomers(query?: string, limit?: number): Promise<Customer[]> {
+// Compact projection returned by the typeahead search
+export type CustomerOption = Omit<Customer, 'created_at' | 'updated_at'>
+
+export async function searchCustomers(query?: string, limit?: number): Promise<CustomerOption[]> {
   const params = new URLSearchParams()
   if (query) params.set('q', query)
   if (limit) params.set('limit', String(limit))
   const qs = params.toString()
-  return fetchApi<Customer[]>(`/api/customers${qs ? `?${qs}` : ''}`)
+  return fetchApi<CustomerOption[]>(`/api/customers${qs ? `?${qs}` : ''}`)
 }
 
 export async function getCustomer(id: number): Promise<Customer> {
@@ -1,4 +1,6 @@
 import { fetchApi } from './client'
+import { waitForJob } from './jobs'
+import type { JobAccepted } from './jobs'
 
 export interface Document {
   id: number
@@ -46,12 +48,28 @@ export interface CreateDocumentRequest {
   price_installation?: number
 }
 
-export async function listDocuments(search?: string, type?: string): Promise<Document[]> {
+// Fields returned by the documents list (no large text columns)
+export type DocumentSummary = Pick<Document,
+  'id' | 'user_id' | 'customer_id' | 'document_type' | 'document_name' | 'recipient_name'
+  | 'recipient_city' | 'customer_type' | 'status' | 'file_path_word' | 'file_path_word_signed'
+  | 'file_path_pdf' | 'file_path_pdf_signed' | 'created_at' | 'updated_at' | 'finalized_at'> & {
+  // Set on search results; matches are wrapped in \u27e6 ... \u27e7
+  rank?: number
+  headline?: string
+}
+
+export interface DocumentPage {
+  documents: DocumentSummary[]
+  next_cursor: string | null
+}
+
+export async function listDocuments(search?: string, type?: string, cursor?: string): Promise<DocumentPage> {
   const params = new URLSearchParams()
   if (search) params.set('search', search)
   if (type) params.set('type', type)
+  if (cursor) params.set('cursor', cursor)
   const qs = params.toString()
-  return fetchApi<Document[]>(`/api/documents${qs ? `?${qs}` : ''}`)
+  return fetchApi<DocumentPage>(`/api/documents${qs ? `?${qs}` : ''}`)
 }
 
 export async function getDocument(id: number): Promise<Document> {
@@ -76,11 +94,21 @@ export async function deleteDocument(id: number): Promise<void> {
   return fetchApi<void>(`/api/documents/${id}`, { method: 'DELETE' })
 }
 
-export async function generateText(id: number, prompt?: string): Promise<Document> {
-  return fetchApi<Document>(`/api/documents/${id}/generate`, {
+/**
+ * Generate text in a background job. With onText the job streams, and onText
+ * is called with the text generated so far; resolves with the saved document.
+ */
+export async function generateText(
+  id: number,
+  prompt?: string,
+  onText?: (text: string) => void,
+): Promise<Document> {
+  const accepted = await fetchApi<JobAccepted>(`/api/documents/${id}/generate`, {
     method: 'POST',
-    body: JSON.stringify({ prompt }),
+    body: JSON.stringify({ prompt, stream: !!onText }),
   })
+  await waitForJob(accepted.job_id, onText)
+  return getDocument(id)
 }
 
 export async function finalizeDocument(id: number): Promise<Document> {
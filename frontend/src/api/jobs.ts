@@ -0,0 +1,43 @@
+import { fetchApi } from './client'
+
+export interface Job {
+  id: number
+  job_type: string
+  status: 'queued' | 'running' | 'done' | 'failed'
+  document_id: number | null
+  result: Record<string, unknown> | null
+  // Text generated so far, while a streaming generate_text job runs
+  progress: string | null
+  error: string | null
+  created_at: string
+  started_at: string | null
+  finished_at: string | null
+}
+
+export interface JobAccepted {
+  job_id: number
+  status: Job['status']
+  document_id: number
+}
+
+const POLL_INTERVAL_MS = 1500
+const PROGRESS_POLL_INTERVAL_MS = 500
+
+export async function getJob(id: number): Promise<Job> {
+  return fetchApi<Job>(`/api/jobs/${id}`)
+}
+
+/** Poll a job until it finishes. onProgress gets the job's partial text as it changes. */
+export async function waitForJob(id: number, onProgress?: (text: string) => void): Promise<Job> {
+  let progress: string | null = null
+  for (;;) {
+    const job = await getJob(id)
+    if (job.status === 'done') return job
+    if (job.status === 'failed') throw new Error(job.error || 'Jobben feilet')
+    if (onProgress && job.progress != null && job.progress !== progress) {
+      progress = job.progress
+      onProgress(progress)
+    }
+    await new Promise((resolve) => setTimeout(resolve, onProgress ? PROGRESS_POLL_INTERVAL_MS : POLL_INTERVAL_MS))
+  }
+}
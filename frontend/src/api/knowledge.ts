@@ -10,6 +10,11 @@ export interface KnowledgeDocument {
   chunk_count: number
 }
 
+export interface KnowledgeUploadResult extends KnowledgeDocument {
+  failed_chunk_count: number
+  failed_batches: { chunks: [number, number]; error: string }[]
+}
+
 export interface KnowledgeChunk {
   id: number
   chunk_index: number
@@ -21,7 +26,7 @@ export interface SearchResult {
   content: string
   filename: string
   category: string
-  similarity: number
+  similarity: number | null
 }
 
 export async function listKnowledge(): Promise<KnowledgeDocument[]> {
@@ -40,7 +45,7 @@ export async function searchKnowledge(query: string): Promise<SearchResult[]> {
   return fetchApi<SearchResult[]>(`/api/admin/knowledge/search?q=${encodeURIComponent(query)}`)
 }
 
-export async function uploadKnowledge(file: File, category: string, description: string): Promise<KnowledgeDocument> {
+export async function uploadKnowledge(file: File, category: string, description: string): Promise<KnowledgeUploadResult> {
   const API_BASE = import.meta.env.VITE_API_URL || ''
   const formData = new FormData()
   formData.append('file', file)
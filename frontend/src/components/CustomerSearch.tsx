@@ -1,9 +1,9 @@
 import { useState, useRef, useEffect } from 'react'
 import { useCustomers } from '../hooks/useCustomers'
-import type { Customer } from '../api/customers'
+import type { CustomerOption } from '../api/customers'
 
 interface Props {
-  onSelect: (customer: Customer) => void
+  onSelect: (customer: CustomerOption) => void
   onNameChange?: (name: string) => void
   selectedName?: string
 }
@@ -24,7 +24,7 @@ export default function CustomerSearch({ onSelect, onNameChange, selectedName }:
     return () => document.removeEventListener('mousedown', handleClick)
   }, [])
 
-  function handleSelect(customer: Customer) {
+  function handleSelect(customer: CustomerOption) {
     onSelect(customer)
     setQuery(customer.name)
     setOpen(false)
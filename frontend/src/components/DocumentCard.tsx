@@ -1,11 +1,11 @@
 import { useNavigate } from 'react-router-dom'
-import type { Document } from '../api/documents'
+import type { DocumentSummary } from '../api/documents'
 import { getDownloadUrl } from '../api/documents'
 import { formatDateTime, DOC_TYPE_LABELS, DOC_TYPE_COLORS } from '../utils/format'
 import { downloadFile } from '../utils/download'
 import { useDeleteDocument, useCloneDocument } from '../hooks/useDocuments'
 
-export default function DocumentCard({ doc }: { doc: Document }) {
+export default function DocumentCard({ doc }: { doc: DocumentSummary }) {
   const navigate = useNavigate()
   const deleteMutation = useDeleteDocument()
   const cloneMutation = useCloneDocument()
@@ -57,6 +57,11 @@ export default function DocumentCard({ doc }: { doc: Document }) {
               {doc.recipient_name}
             </p>
           )}
+          {doc.headline && (
+            <p className="text-sm text-gray-500 dark:text-gray-400 mt-1 line-clamp-2">
+              <Headline text={doc.headline} />
+            </p>
+          )}
           <p className="text-xs text-gray-400 dark:text-gray-600 mt-1">
             {formatDateTime(doc.updated_at)}
           </p>
@@ -118,3 +123,17 @@ function TrashIcon() {
     </svg>
   )
 }
+
+function Headline({ text }: { text: string }) {
+  // Odd parts are the search matches between the \u27e6 ... \u27e7 markers
+  const parts = text.split(/\u27e6|\u27e7/)
+  return (
+    <>
+      {parts.map((part, i) =>
+        i % 2 === 1
+          ? <mark key={i} className="bg-kvtas-50 dark:bg-kvtas-900/30 text-inherit rounded px-0.5">{part}</mark>
+          : <span key={i}>{part}</span>,
+      )}
+    </>
+  )
+}
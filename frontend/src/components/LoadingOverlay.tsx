@@ -13,7 +13,11 @@ const ONE_LINERS = [
   'Skriver med stil...',
 ]
 
-export default function LoadingOverlay() {
+interface Props {
+  text?: string
+}
+
+export default function LoadingOverlay({ text }: Props) {
   const [lineIndex, setLineIndex] = useState(() => Math.floor(Math.random() * ONE_LINERS.length))
 
   useEffect(() => {
@@ -23,6 +27,21 @@ export default function LoadingOverlay() {
     return () => clearInterval(timer)
   }, [])
 
+  if (text) {
+    return (
+      <div className="fixed inset-0 z-50 flex items-center justify-center bg-black/30 backdrop-blur-sm">
+        <div className="bg-white dark:bg-gray-900 rounded-xl shadow-xl p-6 max-w-2xl w-full mx-4">
+          <p className="text-sm text-gray-600 dark:text-gray-400 animate-pulse mb-3">
+            {ONE_LINERS[lineIndex]}
+          </p>
+          <div className="max-h-96 overflow-y-auto whitespace-pre-wrap text-sm text-gray-900 dark:text-gray-100">
+            {text}
+          </div>
+        </div>
+      </div>
+    )
+  }
+
   return (
     <div className="fixed inset-0 z-50 flex items-center justify-center bg-black/30 backdrop-blur-sm">
       <div className="bg-white dark:bg-gray-900 rounded-xl shadow-xl p-8 max-w-sm w-full mx-4 text-center">
@@ -1,4 +1,5 @@
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
+import { useState } from 'react'
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query'
 import {
   listDocuments, getDocument, createDocument, updateDocument,
   deleteDocument, generateText, finalizeDocument, cloneDocument, emailDocument,
@@ -6,9 +7,11 @@ import {
 import type { CreateDocumentRequest, Document } from '../api/documents'
 
 export function useDocuments(search?: string, type?: string) {
-  return useQuery({
+  return useInfiniteQuery({
     queryKey: ['documents', search, type],
-    queryFn: () => listDocuments(search, type),
+    queryFn: ({ pageParam }) => listDocuments(search, type, pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.next_cursor ?? undefined,
   })
 }
 
@@ -49,12 +52,17 @@ export function useDeleteDocument() {
 
 export function useGenerateText() {
   const qc = useQueryClient()
-  return useMutation({
-    mutationFn: ({ id, prompt }: { id: number; prompt?: string }) => generateText(id, prompt),
+  const [streamedText, setStreamedText] = useState('')
+  const mutation = useMutation({
+    mutationFn: ({ id, prompt }: { id: number; prompt?: string }) => {
+      setStreamedText('')
+      return generateText(id, prompt, setStreamedText)
+    },
     onSuccess: (doc) => {
       qc.setQueryData(['documents', doc.id], doc)
     },
   })
+  return { ...mutation, streamedText }
 }
 
 export function useFinalizeDocument() {
@@ -225,7 +225,7 @@ function KnowledgeTab() {
   const qc = useQueryClient()
   const { data: docs, isLoading } = useQuery({ queryKey: ['admin', 'knowledge'], queryFn: listKnowledge })
   const [searchQuery, setSearchQuery] = useState('')
-  const [searchResults, setSearchResults] = useState<{ content: string; filename: string; similarity: number }[] | null>(null)
+  const [searchResults, setSearchResults] = useState<{ content: string; filename: string; similarity: number | null }[] | null>(null)
   const [uploading, setUploading] = useState(false)
   const [category, setCategory] = useState('general')
   const [description, setDescription] = useState('')
@@ -240,7 +240,10 @@ function KnowledgeTab() {
     if (!file) return
     setUploading(true)
     try {
-      await uploadKnowledge(file, category, description)
+      const result = await uploadKnowledge(file, category, description)
+      if (result.failed_chunk_count) {
+        alert(`${result.failed_chunk_count} av ${result.chunk_count + result.failed_chunk_count} chunks kunne ikke indekseres`)
+      }
       qc.invalidateQueries({ queryKey: ['admin', 'knowledge'] })
       setDescription('')
     } catch {
@@ -346,7 +349,7 @@ function KnowledgeTab() {
             {searchResults.map((r, i) => (
               <div key={i} className="bg-white dark:bg-gray-900 border border-gray-200 dark:border-gray-800 rounded p-3">
                 <p className="text-xs text-gray-400 mb-1">
-                  {r.filename} &middot; {(r.similarity * 100).toFixed(1)}% match
+                  {r.filename} &middot; {r.similarity != null ? `${(r.similarity * 100).toFixed(1)}% match` : 'tekstsøk'}
                 </p>
                 <p className="text-sm text-gray-700 dark:text-gray-300 line-clamp-3">{r.content}</p>
               </div>
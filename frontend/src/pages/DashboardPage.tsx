@@ -11,7 +11,10 @@ export default function DashboardPage() {
   const navigate = useNavigate()
   const [search, setSearch] = useState('')
   const [typeFilter, setTypeFilter] = useState('')
-  const { data: documents, isLoading } = useDocuments(search || undefined, typeFilter || undefined)
+  const { data, isLoading, hasNextPage, fetchNextPage, isFetchingNextPage } = useDocuments(
+    search || undefined, typeFilter || undefined,
+  )
+  const documents = data?.pages.flatMap((page) => page.documents)
 
   const handleSearch = useCallback((value: string) => setSearch(value), [])
 
@@ -66,6 +69,15 @@ export default function DashboardPage() {
           {documents.map((doc) => (
             <DocumentCard key={doc.id} doc={doc} />
           ))}
+          {hasNextPage && (
+            <button
+              onClick={() => fetchNextPage()}
+              disabled={isFetchingNextPage}
+              className="px-4 py-2 text-sm text-gray-600 dark:text-gray-400 hover:text-gray-900 dark:hover:text-gray-100 disabled:opacity-50 cursor-pointer"
+            >
+              {isFetchingNextPage ? 'Laster...' : 'Vis flere'}
+            </button>
+          )}
         </div>
       )}
     </div>
@@ -4,7 +4,7 @@ import CustomerSearch from '../../components/CustomerSearch'
 import PriceSection from '../../components/PriceSection'
 import FileUpload from '../../components/FileUpload'
 import type { Document } from '../../api/documents'
-import type { Customer } from '../../api/customers'
+import type { CustomerOption } from '../../api/customers'
 import type { UploadResult } from '../../api/upload'
 import { DOC_TYPE_LABELS } from '../../utils/format'
 
@@ -47,7 +47,7 @@ export default function Step2Fields({ doc, onUpdated, onNext, onPrev }: Props) {
     })
   }, [doc])
 
-  function handleCustomerSelect(customer: Customer) {
+  function handleCustomerSelect(customer: CustomerOption) {
     setFields((f) => ({
       ...f,
       customer_id: customer.id,
@@ -43,7 +43,7 @@ export default function Step3Prompt({ doc, onUpdated, onNext, onPrev }: Props) {
 
   return (
     <div>
-      {generateMutation.isPending && <LoadingOverlay />}
+      {generateMutation.isPending && <LoadingOverlay text={generateMutation.streamedText} />}
 
       <h2 className="text-xl font-semibold text-gray-900 dark:text-gray-100 mb-2">
         {DOC_TYPE_LABELS[doc.document_type]} - Instruksjon
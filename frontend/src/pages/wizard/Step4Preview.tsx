@@ -45,7 +45,7 @@ export default function Step4Preview({ doc, onUpdated, onNext, onPrev }: Props)
 
   return (
     <div>
-      {generateMutation.isPending && <LoadingOverlay />}
+      {generateMutation.isPending && <LoadingOverlay text={generateMutation.streamedText} />}
 
       <div className="mb-6">
         <h2 className="text-xl font-semibold text-gray-900 dark:text-gray-100">